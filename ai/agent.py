@@ -4,35 +4,271 @@
 """
 
 import random
-from ai.state import *
-from utils import *
+import time
+from ai.state import convert_state
+from ai.minimax import SearchContext, SearchTimeout
+from ai.book import OpeningBook
+from ai.ordering import ORDERERS, CENTER_ORDER
+from ai.pvs import aspiration_search
+from ai.solver import Solver, distance_to_end
+from ai.stats import SearchStats
+from ai.transposition import TranspositionTable
+from utils import ARRAY_ENGINE, BITBOARD_ENGINE, YELLOW_NUM, RED_NUM, WIN_SCORE, SOLVER_EMPTY_CELLS, SOLVER_NODE_LIMIT, CACHE_MIN_DEPTH
+
+# Outcome of a minimax search. depth is the deepest fully searched depth, None if no iteration finished.
+# When the position was solved, solved_score is the exact solver score (see ai/solver.py).
+# stats is a SearchStats when the search was asked to collect them.
+class SearchResult:
+    def __init__(self, move, evaluation, depth, nodes, solved_score=None):
+        self.move = move
+        self.evaluation = evaluation
+        self.depth = depth
+        self.nodes = nodes
+        self.solved_score = solved_score
+        self.stats = None
+
+# Algorithms that search with a transposition table and move ordering
+SEARCH_ALGORITHMS = ["minimax", "pvs"]
+
+# Share of a time limited search's budget the exact solver may use, iterative deepening gets what is left if it runs out
+SOLVER_TIME_SHARE = 0.5
 
 class Agent:
-    def __init__(self, algorithm="random", depth=None):
+    def __init__(self, algorithm="random", depth=None, engine=ARRAY_ENGINE, ordering="heuristic", time_limit=None, workers=None, solver_threshold=SOLVER_EMPTY_CELLS, book=None, playouts=None, cache=None):
         self.algorithm = algorithm
         self.depth = depth
+        self.engine = engine
+        # If set, search deeper one ply at a time until time_limit seconds have passed instead of to a fixed depth.
+        # depth, if also given, caps how deep the iterations go.
+        self.time_limit = time_limit
+        # Kept across get_move calls so later moves in the game reuse earlier searches
+        self.tt = TranspositionTable() if algorithm in SEARCH_ALGORITHMS else None
+        self.orderer = ORDERERS[ordering]() if algorithm in SEARCH_ALGORITHMS else None
+        self.context = SearchContext(tt=self.tt, orderer=self.orderer)
+        # Positions with solver_threshold empty cells or fewer are solved exactly instead of searched, None turns this off
+        self.solver_threshold = solver_threshold
+        self.solver = Solver() if algorithm in SEARCH_ALGORITHMS and solver_threshold != None else None
+        # Path of an opening book to play from before searching
+        self.book = OpeningBook(book) if algorithm in SEARCH_ALGORITHMS and book != None else None
+        # The cache, the process pool and MCTS pull in sqlite3, multiprocessing and NumPy, so they are only imported when used.
+        # Path of a persistent position cache to look positions up in before searching and to store results in
+        self.cache = None
+        # Depth the last iterative deepening search finished, how deep cached results must be for a time limited search
+        self.reached_depth = None
+        if algorithm in SEARCH_ALGORITHMS and cache != None:
+            from ai.cache import PositionCache
+            self.cache = PositionCache(cache)
+        # With workers set, the minimax root actions are searched in parallel by a process pool that lives as long as the agent
+        self.parallel = None
+        if algorithm == "minimax" and workers is not None:
+            from ai.parallel import ParallelSearcher
+            self.parallel = ParallelSearcher(workers, ordering)
+        # "mcts" searches for time_limit seconds or until it has played playouts random games, whichever comes first.
+        # Its tree is kept between moves.
+        self.playouts = playouts
+        self.mcts = None
+        if algorithm == "mcts":
+            from ai.mcts import MCTS
+            self.mcts = MCTS()
+
+    # Stop the worker processes and close the opening book and the position cache, if any
+    def close(self):
+        if self.parallel is not None:
+            self.parallel.close()
+        if self.book is not None:
+            self.book.close()
+        if self.cache is not None:
+            self.cache.close()
 
     # Given a state, generate the next move based on the algorithm
-    def get_move(self, state):
+    # With stats=True, returns (move, SearchStats) instead, the stats are None if the move was not searched for
+    def get_move(self, state, stats=False):
+        state = convert_state(state, self.engine)
+        move = None
+        search_stats = None
         if self.algorithm == "random":
-          return random.choice(state.get_legal_actions())
-        elif self.algorithm == "minimax":
-            if self.depth == None:
-                return None
-            legal_actions = state.get_legal_actions()
-            best_action = None
-            best_evaluation = WIN_SCORE+1 if state.turn == RED_NUM else -WIN_SCORE-1
-            for action in legal_actions:
-                new_state = state.get_new_state(action)
-                evaluation = new_state.get_evaluation(depth=self.depth)
-                if state.turn == YELLOW_NUM:
-                    if evaluation > best_evaluation:
-                        best_evaluation = evaluation
-                        best_action = action
-                else:
-                    if evaluation < best_evaluation:
-                        best_evaluation = evaluation
-                        best_action = action
-            return best_action
+          move = random.choice(state.get_legal_actions())
+        elif self.algorithm in SEARCH_ALGORITHMS:
+            if self.depth != None or self.time_limit != None:
+                result = self.search(state, stats=stats)
+                move = result.move
+                search_stats = result.stats
+        elif self.algorithm == "mcts":
+            if self.time_limit != None or self.playouts != None:
+                move = self.mcts.search(state, self.time_limit, self.playouts)
         
-        return None
+        return (move, search_stats) if stats else move
+
+    # With stats=True the result carries a SearchStats, see ai/stats.py.
+    # profiler is entered around this one search, e.g. cProfile.Profile() or any profiler that works as a context manager.
+    def search(self, state, stats=False, profiler=None):
+        self.context.stats = SearchStats() if stats else None
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                with profiler:
+                    result = self.find_move(state)
+            else:
+                result = self.find_move(state)
+        finally:
+            search_stats = self.context.stats
+            self.context.stats = None
+        if search_stats is not None:
+            search_stats.seconds = time.perf_counter() - start
+        result.stats = search_stats
+        # Book and cache moves have no nodes and are already stored
+        if self.cache != None and result.nodes > 0:
+            self.record(state, result)
+        return result
+
+    # Store a search result in the position cache if it is deep enough. Solved positions count as searched to the end.
+    def record(self, state, result):
+        state = convert_state(state, BITBOARD_ENGINE)
+        depth = 42 - sum(state.heights) if result.solved_score != None else result.depth
+        if depth != None and depth >= CACHE_MIN_DEPTH:
+            self.cache.store(state, result.move, result.evaluation, depth)
+
+    def find_move(self, state):
+        stats = self.context.stats
+        if self.book != None:
+            book_move = self.book.lookup(convert_state(state, BITBOARD_ENGINE))
+            if book_move != None:
+                if stats != None:
+                    stats.source = "book"
+                return SearchResult(book_move[0], book_move[1], self.book.depth, 0)
+        min_depth = self.cache_min_depth()
+        if self.cache != None and min_depth != None:
+            cached = self.cache.lookup(convert_state(state, BITBOARD_ENGINE), min_depth)
+            if cached != None:
+                if stats != None:
+                    stats.source = "cache"
+                return SearchResult(cached[0], cached[1], cached[2], 0)
+
+        self.tt.new_search()
+        self.orderer.new_search()
+        self.context.nodes = 0
+
+        # Search on a private copy that is modified in place and scores its leaves incrementally
+        state = convert_state(state, self.engine).copy()
+        start = time.perf_counter()
+        if self.solver != None and 42 - sum(state.heights) <= self.solver_threshold:
+            try:
+                if self.time_limit == None:
+                    result = self.solve(state, max_nodes=SOLVER_NODE_LIMIT)
+                else:
+                    result = self.solve(state, start + SOLVER_TIME_SHARE * self.time_limit)
+                if stats != None:
+                    stats.source = "solver"
+                    stats.solver_nodes = result.nodes
+                return result
+            except SearchTimeout:
+                if stats != None:
+                    stats.solver_nodes = self.context.nodes
+                # The solver ran out of time or nodes and the search takes over, unless a fixed depth search was stopped
+                if self.time_limit == None and self.context.stop is not None and self.context.stop.is_set():
+                    raise
+        state.attach_evaluator()
+
+        if self.time_limit == None:
+            self.context.depth = self.depth
+            best_action, best_evaluation = self.search_root(state, self.depth)
+            if stats != None:
+                stats.iterations.append((self.depth, self.context.nodes, time.perf_counter() - start))
+            return SearchResult(best_action, best_evaluation, self.depth, self.context.nodes)
+
+        # Iterative deepening, the result of the last iteration that finished is kept
+        legal_actions = state.get_legal_actions()
+        result = SearchResult(min(legal_actions, key=lambda action: CENTER_ORDER.index(action)), None, None, 0)
+        max_depth = 42 - sum(state.heights) - 1
+        win = WIN_SCORE if state.turn == YELLOW_NUM else -WIN_SCORE
+        self.context.deadline = start + self.time_limit
+        try:
+            for depth in range(max_depth + 1):
+                if self.depth != None and depth > self.depth:
+                    break
+                iteration_start = time.perf_counter()
+                nodes = self.context.nodes
+                self.context.depth = depth
+                best_action, best_evaluation = self.search_root(state, depth, first_action=result.move, guess=result.evaluation)
+                result = SearchResult(best_action, best_evaluation, depth, self.context.nodes)
+                if stats != None:
+                    stats.iterations.append((depth, self.context.nodes - nodes, time.perf_counter() - iteration_start))
+                # A forced win will not go away with a deeper search
+                if best_evaluation == win:
+                    break
+        except SearchTimeout:
+            result.nodes = self.context.nodes
+        finally:
+            self.context.deadline = None
+        if result.depth != None:
+            self.reached_depth = result.depth
+        return result
+
+    # A cached result is only played if it is at least as deep as searching would go: the fixed depth, or the depth the
+    # last time limited search reached (capped by depth, if set). None until a time limited agent has searched once.
+    def cache_min_depth(self):
+        if self.time_limit == None:
+            return self.depth
+        if self.reached_depth == None:
+            return None
+        min_depth = max(self.reached_depth, CACHE_MIN_DEPTH)
+        return min(min_depth, self.depth) if self.depth != None else min_depth
+
+    # Raises SearchTimeout if the deadline (a time.perf_counter() value) passes, max_nodes nodes are searched
+    # or the search is stopped first
+    def solve(self, state, deadline=None, max_nodes=None):
+        self.solver.nodes = 0
+        self.solver.context = self.context
+        self.context.deadline = deadline
+        self.context.max_nodes = None if max_nodes == None else self.context.nodes + max_nodes
+        try:
+            best_action, score = self.solver.best_action(convert_state(state, BITBOARD_ENGINE))
+        finally:
+            self.solver.context = None
+            self.context.deadline = None
+            self.context.max_nodes = None
+        sign = 1 if state.turn == YELLOW_NUM else -1
+        evaluation = sign * WIN_SCORE if score > 0 else -sign * WIN_SCORE if score < 0 else 0
+        return SearchResult(best_action, evaluation, distance_to_end(score, sum(state.heights)), self.solver.nodes, score)
+
+    # Evaluate every legal action to the given depth. Ties go to the lowest column whatever order the actions are searched in.
+    # guess is the previous iteration's evaluation, used by PVS to centre its aspiration window.
+    def search_root(self, state, depth, first_action=None, guess=None):
+        if self.algorithm == "pvs":
+            # PVS scores from the point of view of the player to move
+            sign = 1 if state.turn == YELLOW_NUM else -1
+            best_action, best_evaluation = aspiration_search(state, depth, self.context, None if guess == None else sign * guess, first_action)
+            return best_action, sign * best_evaluation
+
+        if self.parallel is not None:
+            # The workers' nodes count even when the iteration times out or is stopped
+            try:
+                return self.parallel.search_root(state, depth, self.context.deadline, self.context.stats, self.context.stop)
+            finally:
+                self.context.nodes += self.parallel.nodes
+
+        legal_actions = state.get_legal_actions()
+        if first_action in legal_actions:
+            legal_actions.remove(first_action)
+            legal_actions.insert(0, first_action)
+
+        stats = self.context.stats
+        best_action = None
+        best_evaluation = WIN_SCORE+1 if state.turn == RED_NUM else -WIN_SCORE-1
+        for action in legal_actions:
+            if stats != None:
+                start = time.perf_counter()
+            state.play(action)
+            evaluation = state.get_evaluation(depth=depth, context=self.context, ply=1)
+            state.undo(action)
+            if stats != None:
+                stats.record_root(action, time.perf_counter() - start)
+            if state.turn == YELLOW_NUM:
+                if evaluation > best_evaluation or (evaluation == best_evaluation and action < best_action):
+                    best_evaluation = evaluation
+                    best_action = action
+            else:
+                if evaluation < best_evaluation or (evaluation == best_evaluation and action < best_action):
+                    best_evaluation = evaluation
+                    best_action = action
+        return best_action, best_evaluation
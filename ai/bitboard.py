@@ -0,0 +1,249 @@
+"""
+    bitboard.py
+    Contains the BitboardState class, a GameState replacement that stores the board as two integer bitmasks
+"""
+
+from ai.incremental import IncrementalEvaluator
+from ai.minimax import minimax
+from ai.transposition import ZOBRIST, ZOBRIST_TURN
+from ai.windows import WINDOWS, ROWS, COLS
+from utils import YELLOW_NUM, RED_NUM, THREE_IN_ROW_MULT, TWO_IN_ROW_MULT, CENTER_MULT
+
+ACTIONS = [0, 1, 2, 3, 4, 5, 6]
+
+# Each column takes ROWS+1 bits, the extra bit on top acts as a sentinel so shifts never wrap between columns.
+# Bit (col*(ROWS+1) + h) is the cell in column col, h rows up from the bottom, i.e. board[ROWS-1-h][col].
+COL_HEIGHT = ROWS + 1
+
+def bit(row, col):
+    return 1 << (col*COL_HEIGHT + ROWS-1-row)
+
+def bottom_mask(col):
+    return 1 << (col*COL_HEIGHT)
+
+def top_mask(col):
+    return 1 << (col*COL_HEIGHT + ROWS-1)
+
+def column_mask(col):
+    return ((1 << ROWS) - 1) << (col*COL_HEIGHT)
+
+FULL_MASK = sum(column_mask(col) for col in ACTIONS)
+CENTER_MASK = column_mask(3)
+WINDOW_MASKS = [sum(bit(i, j) for i, j in window) for window in WINDOWS]
+
+def has_four(pos):
+    # Vertical, horizontal, and the two diagonals
+    for shift in (1, COL_HEIGHT, COL_HEIGHT-1, COL_HEIGHT+1):
+        pairs = pos & (pos >> shift)
+        if pairs & (pairs >> (2*shift)):
+            return True
+    return False
+
+class BitboardState:
+    def __init__(self, current, mask, turn, hash=None, heights=None, moves=None):
+        self.current = current # Pieces of the player whose turn it is
+        self.mask = mask # Pieces of both players
+        self.turn = turn
+        # Zobrist hash of the position, same keys as GameState so both engines can share a table
+        self.hash = self.compute_hash() if hash is None else hash
+        # Number of pieces in each column
+        self.heights = [(mask & column_mask(col)).bit_count() for col in ACTIONS] if heights is None else heights
+        # Columns played since the state was created from bitmasks, used to tell who made the last move
+        self.moves = [] if moves is None else moves
+        # Optional running score, updated by play/undo
+        self.evaluator = None
+        self._board = None
+
+    def copy(self):
+        return BitboardState(self.current, self.mask, self.turn, self.hash, self.heights.copy(), self.moves.copy())
+
+    # Keep the depth 0 score up to date through play/undo so evaluate() is O(1)
+    def attach_evaluator(self):
+        self.evaluator = IncrementalEvaluator()
+        for player_num in (YELLOW_NUM, RED_NUM):
+            pieces = self.get_pieces(player_num)
+            for i in range(ROWS):
+                for j in range(COLS):
+                    if pieces & bit(i, j):
+                        self.evaluator.add(i, j, player_num)
+
+    @classmethod
+    def from_board(cls, board, turn):
+        current = 0
+        mask = 0
+        for i in range(ROWS):
+            for j in range(COLS):
+                if board[i][j] != 0:
+                    mask |= bit(i, j)
+                    if board[i][j] == turn:
+                        current |= bit(i, j)
+        return cls(current, mask, turn)
+
+    # Array form of the board, same layout as GameState.board. Treat it as read only.
+    @property
+    def board(self):
+        if self._board is None:
+            import numpy as np
+            board = np.zeros((ROWS, COLS))
+            other = RED_NUM if self.turn == YELLOW_NUM else YELLOW_NUM
+            for i in range(ROWS):
+                for j in range(COLS):
+                    if self.current & bit(i, j):
+                        board[i][j] = self.turn
+                    elif self.mask & bit(i, j):
+                        board[i][j] = other
+            self._board = board
+        return self._board
+
+    def compute_hash(self):
+        h = ZOBRIST_TURN if self.turn == RED_NUM else 0
+        other = RED_NUM if self.turn == YELLOW_NUM else YELLOW_NUM
+        for i in range(ROWS):
+            for j in range(COLS):
+                if self.current & bit(i, j):
+                    h ^= ZOBRIST[self.turn][i][j]
+                elif self.mask & bit(i, j):
+                    h ^= ZOBRIST[other][i][j]
+        return h
+
+    def get_pieces(self, player_num):
+        return self.current if player_num == self.turn else self.current ^ self.mask
+
+    def change_turn(self):
+        self.current ^= self.mask
+        self.turn = RED_NUM if self.turn == YELLOW_NUM else YELLOW_NUM
+        self.hash ^= ZOBRIST_TURN
+
+    def is_winning(self, player_num):
+        return has_four(self.get_pieces(player_num))
+
+    # Only the player who just moved can have made a new four, so their pieces are the only ones checked
+    def is_winning_move(self):
+        return has_four(self.current ^ self.mask)
+
+    # Returns the player with four in a row, or None. Falls back to checking both players when the last move is unknown.
+    # Only the owner of the last piece can have a new four. That is normally the player not to move,
+    # but Connect4Game leaves the turn on the winner once the game is over.
+    def get_winner(self):
+        if self.moves:
+            action = self.moves[-1]
+            if self.current & (1 << (action*COL_HEIGHT + self.heights[action] - 1)):
+                return self.turn if has_four(self.current) else None
+            if self.is_winning_move():
+                return RED_NUM if self.turn == YELLOW_NUM else YELLOW_NUM
+            return None
+        if self.is_winning(YELLOW_NUM):
+            return YELLOW_NUM
+        if self.is_winning(RED_NUM):
+            return RED_NUM
+        return None
+
+    def is_tie(self):
+        return self.mask == FULL_MASK
+
+    def is_legal_action(self, action):
+        return self.mask & top_mask(action) == 0
+
+    def get_legal_actions(self, sort=False):
+        legal_actions = [action for action in ACTIONS if self.is_legal_action(action)]
+        if not sort:
+            return legal_actions
+
+        # If sort == True, sort actions by depth 0 evaluation
+        return sorted(legal_actions, key=self.get_sort_key)
+
+    def get_sort_key(self, action):
+        self.play(action)
+        evaluation = minimax(self, depth=0)
+        self.undo(action)
+        return evaluation
+
+    def get_new_state(self, action):
+        if self.is_legal_action(action):
+            row = ROWS-1 - self.heights[action]
+            new_hash = self.hash ^ ZOBRIST[self.turn][row][action] ^ ZOBRIST_TURN
+            new_heights = self.heights.copy()
+            new_heights[action] += 1
+            return BitboardState(self.current ^ self.mask, self.mask | (self.mask + bottom_mask(action)),
+                                 YELLOW_NUM if self.turn == RED_NUM else RED_NUM, new_hash, new_heights, self.moves + [action])
+        return self
+
+    # In-place version of get_new_state used by the search. The action must be legal.
+    def play(self, action):
+        row = ROWS-1 - self.heights[action]
+        self.hash ^= ZOBRIST[self.turn][row][action] ^ ZOBRIST_TURN
+        if self.evaluator is not None:
+            self.evaluator.add(row, action, self.turn)
+        self.current ^= self.mask
+        self.mask |= bottom_mask(action) << self.heights[action]
+        self.heights[action] += 1
+        self.moves.append(action)
+        self.turn = YELLOW_NUM if self.turn == RED_NUM else RED_NUM
+        self._board = None
+
+    # Take back the last piece played in the given column
+    def undo(self, action):
+        self.heights[action] -= 1
+        self.moves.pop()
+        self.mask ^= bottom_mask(action) << self.heights[action]
+        self.current ^= self.mask
+        self.turn = YELLOW_NUM if self.turn == RED_NUM else RED_NUM
+        row = ROWS-1 - self.heights[action]
+        self.hash ^= ZOBRIST[self.turn][row][action] ^ ZOBRIST_TURN
+        if self.evaluator is not None:
+            self.evaluator.remove(row, action, self.turn)
+        self._board = None
+
+    def get_evaluation(self, depth=2, context=None, ply=0):
+        return minimax(self, depth=depth, context=context, ply=ply)
+
+    # Depth 0 score, the count_* functions combined into a single pass over the windows when no evaluator is attached
+    def evaluate(self):
+        if self.evaluator is not None:
+            return self.evaluator.evaluate()
+        yellow = self.get_pieces(YELLOW_NUM)
+        red = self.get_pieces(RED_NUM)
+        score = CENTER_MULT * ((yellow & CENTER_MASK).bit_count() - (red & CENTER_MASK).bit_count())
+        for window in WINDOW_MASKS:
+            if red & window == 0:
+                yellow_count = (yellow & window).bit_count()
+                if yellow_count == 3:
+                    score += THREE_IN_ROW_MULT
+                elif yellow_count == 2:
+                    score += TWO_IN_ROW_MULT
+            elif yellow & window == 0:
+                red_count = (red & window).bit_count()
+                if red_count == 3:
+                    score -= THREE_IN_ROW_MULT
+                elif red_count == 2:
+                    score -= TWO_IN_ROW_MULT
+        return score
+
+    def count_three_in_row(self):
+        yellow = self.get_pieces(YELLOW_NUM)
+        red = self.get_pieces(RED_NUM)
+        count = 0
+        for window in WINDOW_MASKS:
+            yellow_count = (yellow & window).bit_count()
+            red_count = (red & window).bit_count()
+            if yellow_count == 3 and red_count == 0:
+                count += 1
+            elif red_count == 3 and yellow_count == 0:
+                count -= 1
+        return count
+
+    def count_two_in_row(self):
+        yellow = self.get_pieces(YELLOW_NUM)
+        red = self.get_pieces(RED_NUM)
+        count = 0
+        for window in WINDOW_MASKS:
+            yellow_count = (yellow & window).bit_count()
+            red_count = (red & window).bit_count()
+            if yellow_count == 2 and red_count == 0:
+                count += 1
+            elif red_count == 2 and yellow_count == 0:
+                count -= 1
+        return count
+
+    def count_center(self):
+        return (self.get_pieces(YELLOW_NUM) & CENTER_MASK).bit_count() - (self.get_pieces(RED_NUM) & CENTER_MASK).bit_count()
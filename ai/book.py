@@ -0,0 +1,111 @@
+"""
+    book.py
+    Opening book: a sorted binary file of early positions with their best move, read through mmap
+
+    File layout (little endian):
+        header:  magic b"C4BK", version (uint16), record size (uint16), search depth (uint32), record count (uint64)
+        records: position key (uint64), best move (uint8), evaluation (int64), sorted by key
+
+    Keys are BitboardState.current + BitboardState.mask, which is unique per position, reduced to the smaller of
+    the key and the key of the mirrored position. Moves are stored for whichever orientation gave the smaller key.
+"""
+
+import mmap
+import struct
+from ai.bitboard import ACTIONS, COL_HEIGHT
+
+MAGIC = b"C4BK"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQ")
+RECORD = struct.Struct("<QBq")
+
+COLUMN_BITS = (1 << COL_HEIGHT) - 1
+
+def mirror(bits):
+    mirrored = 0
+    for col in ACTIONS:
+        mirrored |= ((bits >> (col*COL_HEIGHT)) & COLUMN_BITS) << ((6-col)*COL_HEIGHT)
+    return mirrored
+
+# Returns (canonical key, whether the position had to be mirrored to get it)
+def canonical_key(current, mask):
+    key = current + mask
+    mirrored_key = mirror(current) + mirror(mask)
+    if mirrored_key < key:
+        return mirrored_key, True
+    return key, False
+
+class OpeningBook:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, self.depth, self.size = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not an opening book this version can read")
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    # Returns (move, evaluation) for a BitboardState, or None if the position is not in the book
+    def lookup(self, state):
+        key, mirrored = canonical_key(state.current, state.mask)
+        low = 0
+        high = self.size
+        while low < high:
+            middle = (low + high) // 2
+            record_key, move, evaluation = RECORD.unpack_from(self.data, HEADER.size + middle*RECORD.size)
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return (6 - move if mirrored else move), evaluation
+        return None
+
+# Search every position up to the given number of plies from the start and write the book to path
+def build_book(path, plies, depth, algorithm="pvs", progress=None):
+    from ai.agent import Agent
+    from ai.state import new_state
+    from utils import BITBOARD_ENGINE
+
+    agent = Agent(algorithm=algorithm, depth=depth, engine=BITBOARD_ENGINE, solver_threshold=None)
+    records = {}
+    frontier = [new_state(BITBOARD_ENGINE)]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for state in frontier:
+            key, mirrored = canonical_key(state.current, state.mask)
+            if key in records:
+                continue
+            result = agent.search(state)
+            records[key] = (6 - result.move if mirrored else result.move, result.evaluation)
+            if progress is not None:
+                progress(len(records))
+            if ply < plies:
+                for action in state.get_legal_actions():
+                    child = state.get_new_state(action)
+                    if child.get_winner() is None and not child.is_tie():
+                        next_frontier.append(child)
+        frontier = next_frontier
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, depth, len(records)))
+        for key in sorted(records):
+            move, evaluation = records[key]
+            file.write(RECORD.pack(key, move, evaluation))
+    return len(records)
+
+if __name__ == "__main__":
+    import argparse
+    from utils import BOT_DEPTH, BOOK_PATH
+
+    parser = argparse.ArgumentParser(description="Build an opening book")
+    parser.add_argument("--plies", type=int, default=6, help="deepest ply from the start to include")
+    parser.add_argument("--depth", type=int, default=BOT_DEPTH + 4, help="search depth for each position")
+    parser.add_argument("--output", default=BOOK_PATH)
+    args = parser.parse_args()
+
+    count = build_book(args.output, args.plies, args.depth, progress=lambda n: print(f"\r{n} positions", end="", flush=True))
+    print(f"\nWrote {count} positions to {args.output}")
@@ -0,0 +1,93 @@
+"""
+    cache.py
+    Persistent position cache: search results kept in an SQLite file, so they survive restarts and are shared between processes
+
+    Positions are keyed like the opening book (ai/book.py), so a position and its mirror image share an entry.
+    The database runs in WAL mode, which lets any number of processes read while one writes. Each PositionCache
+    buffers its own writes and commits them in batches. When the file holds more than max_entries positions,
+    the least recently used ones are removed.
+"""
+
+import sqlite3
+import time
+from ai.book import canonical_key
+from utils import CACHE_MAX_ENTRIES
+
+# Writes are committed once this many are buffered or this many seconds after the oldest one
+CACHE_BATCH_SIZE = 64
+CACHE_FLUSH_SECONDS = 5.0
+
+# Share of max_entries removed at once when the cache is full, so eviction does not run on every commit
+CACHE_EVICTION_SLACK = 0.1
+
+class PositionCache:
+    def __init__(self, path, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        # The agent using the cache may search on a background thread, one thread at a time
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS positions "
+                                    "(key INTEGER PRIMARY KEY, depth INTEGER, move INTEGER, evaluation INTEGER, used REAL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS positions_used ON positions (used)")
+        self.pending = {} # key -> (depth, move, evaluation, used) not committed yet
+        self.touched = {} # key -> used, for entries read since the last commit
+        self.oldest_pending = None
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    # Returns (move, evaluation, depth) for a BitboardState searched at least min_depth deep, or None
+    def lookup(self, state, min_depth=0):
+        key, mirrored = canonical_key(state.current, state.mask)
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = self.connection.execute("SELECT depth, move, evaluation FROM positions WHERE key = ?", (key,)).fetchone()
+        if entry is None or entry[0] < min_depth:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touched[key] = time.time()
+        depth, move, evaluation = entry[:3]
+        return (6 - move if mirrored else move), evaluation, depth
+
+    # Record the result of searching a BitboardState to depth. Entries are only replaced by results at least as deep.
+    def store(self, state, move, evaluation, depth):
+        key, mirrored = canonical_key(state.current, state.mask)
+        old = self.pending.get(key)
+        if old is not None and old[0] > depth:
+            return
+        self.pending[key] = (depth, 6 - move if mirrored else move, evaluation, time.time())
+        if self.oldest_pending is None:
+            self.oldest_pending = time.perf_counter()
+        if len(self.pending) >= CACHE_BATCH_SIZE or time.perf_counter() - self.oldest_pending > CACHE_FLUSH_SECONDS:
+            self.flush()
+
+    # Commit buffered writes and access times in one transaction, then evict if the cache is over its size
+    def flush(self):
+        if not self.pending and not self.touched:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO positions (key, depth, move, evaluation, used) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET depth = excluded.depth, move = excluded.move, evaluation = excluded.evaluation, used = excluded.used "
+                "WHERE excluded.depth >= positions.depth",
+                [(key,) + entry for key, entry in self.pending.items()])
+            self.connection.executemany("UPDATE positions SET used = ? WHERE key = ?", [(used, key) for key, used in self.touched.items()])
+            if self.pending:
+                count = self.connection.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+                if count > self.max_entries:
+                    excess = count - self.max_entries + int(self.max_entries * CACHE_EVICTION_SLACK)
+                    self.connection.execute("DELETE FROM positions WHERE key IN (SELECT key FROM positions ORDER BY used LIMIT ?)", (excess,))
+        self.pending = {}
+        self.touched = {}
+        self.oldest_pending = None
+
+    def __len__(self):
+        self.flush()
+        return self.connection.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
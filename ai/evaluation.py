@@ -0,0 +1,37 @@
+"""
+    evaluation.py
+    Vectorized version of the GameState heuristic that scores a board, or a stack of boards, in one pass
+"""
+
+import numpy as np
+from ai.windows import WINDOWS, ROWS, COLS
+from utils import YELLOW_NUM, RED_NUM, THREE_IN_ROW_MULT, TWO_IN_ROW_MULT, CENTER_MULT
+
+# 69x4 table of flat cell indices (row*COLS + col), one row per window
+WINDOW_INDICES = np.array([[i*COLS + j for i, j in window] for window in WINDOWS])
+CENTER_INDICES = np.array([i*COLS + 3 for i in range(ROWS)])
+
+# Takes a (6, 7) board or an (N, 6, 7) stack of boards.
+# Returns the three-in-row, two-in-row and center counts, each a scalar or a length N array.
+def count_windows(boards):
+    boards = np.asarray(boards)
+    flat = boards.reshape(-1, ROWS*COLS)
+    cells = flat[:, WINDOW_INDICES]
+
+    # Classify every window by how many pieces each player has in it
+    yellow = np.count_nonzero(cells == YELLOW_NUM, axis=2)
+    red = np.count_nonzero(cells == RED_NUM, axis=2)
+    three = np.count_nonzero((yellow == 3) & (red == 0), axis=1) - np.count_nonzero((red == 3) & (yellow == 0), axis=1)
+    two = np.count_nonzero((yellow == 2) & (red == 0), axis=1) - np.count_nonzero((red == 2) & (yellow == 0), axis=1)
+
+    center_cells = flat[:, CENTER_INDICES]
+    center = np.count_nonzero(center_cells == YELLOW_NUM, axis=1) - np.count_nonzero(center_cells == RED_NUM, axis=1)
+
+    if boards.ndim == 2:
+        return int(three[0]), int(two[0]), int(center[0])
+    return three, two, center
+
+# Depth 0 minimax score of a board or a stack of boards
+def evaluate_boards(boards):
+    three, two, center = count_windows(boards)
+    return THREE_IN_ROW_MULT * three + TWO_IN_ROW_MULT * two + CENTER_MULT * center
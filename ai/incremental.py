@@ -0,0 +1,54 @@
+"""
+    incremental.py
+    Contains the IncrementalEvaluator class which keeps the depth 0 score up to date as pieces are played and undone
+"""
+
+from ai.windows import WINDOWS, ROWS, COLS
+from utils import YELLOW_NUM, THREE_IN_ROW_MULT, TWO_IN_ROW_MULT, CENTER_MULT
+
+# Indices of the windows passing through each cell (at most 16)
+CELL_WINDOWS = [[[w for w, window in enumerate(WINDOWS) if (i, j) in window] for j in range(COLS)] for i in range(ROWS)]
+
+# Contribution of a window to the three-in-row and two-in-row counts, indexed by [yellow pieces][red pieces]
+THREE_COUNTS = [[0]*5 for _ in range(5)]
+TWO_COUNTS = [[0]*5 for _ in range(5)]
+THREE_COUNTS[3][0] = 1
+THREE_COUNTS[0][3] = -1
+TWO_COUNTS[2][0] = 1
+TWO_COUNTS[0][2] = -1
+
+class IncrementalEvaluator:
+    def __init__(self):
+        # Pieces of each player in every window
+        self.yellow_counts = [0] * len(WINDOWS)
+        self.red_counts = [0] * len(WINDOWS)
+        # Running totals, same values as GameState.count_three_in_row/count_two_in_row/count_center
+        self.three_in_row = 0
+        self.two_in_row = 0
+        self.center = 0
+
+    def evaluate(self):
+        return THREE_IN_ROW_MULT * self.three_in_row + TWO_IN_ROW_MULT * self.two_in_row + CENTER_MULT * self.center
+
+    def add(self, row, col, player_num):
+        self._update(row, col, player_num, 1)
+
+    def remove(self, row, col, player_num):
+        self._update(row, col, player_num, -1)
+
+    def _update(self, row, col, player_num, delta):
+        yellow_counts = self.yellow_counts
+        red_counts = self.red_counts
+        counts = yellow_counts if player_num == YELLOW_NUM else red_counts
+        for w in CELL_WINDOWS[row][col]:
+            yellow = yellow_counts[w]
+            red = red_counts[w]
+            self.three_in_row -= THREE_COUNTS[yellow][red]
+            self.two_in_row -= TWO_COUNTS[yellow][red]
+            counts[w] += delta
+            yellow = yellow_counts[w]
+            red = red_counts[w]
+            self.three_in_row += THREE_COUNTS[yellow][red]
+            self.two_in_row += TWO_COUNTS[yellow][red]
+        if col == 3:
+            self.center += delta if player_num == YELLOW_NUM else -delta
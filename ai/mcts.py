@@ -0,0 +1,171 @@
+"""
+    mcts.py
+    Monte Carlo tree search with UCT selection. Every leaf reached is scored by a batch of random playouts,
+    played out together on a stack of boards with NumPy instead of one Python loop per playout.
+    The tree is kept between moves and reused when the game reaches a position already in it.
+"""
+
+import math
+import random
+import time
+import numpy as np
+from ai.evaluation import WINDOW_INDICES
+from ai.ordering import CENTER_ORDER
+from ai.state import convert_state
+from ai.windows import ROWS, COLS
+from utils import BITBOARD_ENGINE, MCTS_EXPLORATION, MCTS_BATCH_SIZE
+
+CELLS = ROWS * COLS
+
+# Flat indices of the four cells of every window through each cell, (CELLS, 16, 4).
+# Cells in fewer than 16 windows are padded with windows made of cell CELLS, an extra column of the stacked boards that is always empty.
+CELL_WINDOW_INDICES = np.full((CELLS, 16, 4), CELLS)
+for _cell in range(CELLS):
+    _windows = WINDOW_INDICES[(WINDOW_INDICES == _cell).any(axis=1)]
+    CELL_WINDOW_INDICES[_cell, :len(_windows)] = _windows
+
+# Play count random games from a (ROWS, COLS) board to the end, all at once.
+# Returns the winner of each game as an array, 0 for a tie.
+def rollout(board, heights, turn, count, rng):
+    boards = np.zeros((count, CELLS + 1), dtype=np.int8)
+    boards[:, :CELLS] = np.asarray(board, dtype=np.int8).reshape(CELLS)
+    heights = np.tile(np.asarray(heights), (count, 1))
+    players = np.full(count, turn, dtype=np.int8)
+    winners = np.zeros(count, dtype=np.int8)
+    active = np.arange(count)
+    while active.size:
+        legal = heights[active] < ROWS
+        # Games with a full board end in a tie
+        active = active[legal.any(axis=1)]
+        if not active.size:
+            break
+        legal = heights[active] < ROWS
+
+        # A uniformly random legal column for every game: the legal column with the largest random key
+        cols = np.argmax(rng.random(legal.shape) * legal, axis=1)
+        cells = (ROWS - 1 - heights[active, cols]) * COLS + cols
+        movers = players[active]
+        boards[active, cells] = movers
+        heights[active, cols] += 1
+
+        # Only the windows through the new piece can have been completed
+        windows = boards[active[:, None, None], CELL_WINDOW_INDICES[cells]]
+        won = (windows == movers[:, None, None]).all(axis=2).any(axis=1)
+        winners[active[won]] = movers[won]
+        active = active[~won]
+        players[active] = 3 - players[active]
+    return winners
+
+class Node:
+    __slots__ = ("parent", "action", "hash", "mover", "children", "untried", "terminal", "visits", "reward")
+
+    def __init__(self, parent, action, state):
+        self.parent = parent
+        self.action = action # Action that led here from parent
+        self.hash = state.hash
+        self.mover = 3 - state.turn # Player who made action, reward is counted from their point of view
+        self.children = {}
+        winner = state.get_winner()
+        # Reward per playout for the mover if the game is over here, else None
+        self.terminal = 1.0 if winner != None else 0.5 if state.is_tie() else None
+        self.untried = [] if self.terminal != None else [action for action in CENTER_ORDER if state.is_legal_action(action)]
+        self.visits = 0
+        self.reward = 0.0 # Wins plus half the ties, over all playouts through this node
+
+    def uct_child(self, exploration):
+        log_visits = math.log(self.visits)
+        return max(self.children.values(), key=lambda child: child.reward / child.visits + exploration * math.sqrt(log_visits / child.visits))
+
+class MCTS:
+    def __init__(self, exploration=MCTS_EXPLORATION, batch_size=MCTS_BATCH_SIZE, seed=None):
+        self.exploration = exploration
+        self.batch_size = batch_size # Playouts per leaf
+        self.rng = np.random.default_rng(seed)
+        self.root = None
+        # Figures for the last search
+        self.playouts = 0
+        self.seconds = 0.0
+        self.reused = 0 # Playouts already in the tree when the search started
+
+    def playouts_per_second(self):
+        return self.playouts / self.seconds if self.seconds > 0 else 0.0
+
+    # Reuse the part of the tree under the node for state, if it is the root or up to two moves below it
+    def find_root(self, state):
+        if self.root != None:
+            nodes = [self.root]
+            for _ in range(3):
+                for node in nodes:
+                    if node.hash == state.hash:
+                        node.parent = None
+                        return node
+                nodes = [child for node in nodes for child in node.children.values()]
+        return Node(None, None, state)
+
+    # Search until time_limit seconds have passed or playouts playouts have been played, whichever comes first.
+    # Returns the most visited action.
+    def search(self, state, time_limit=None, playouts=None):
+        state = convert_state(state, BITBOARD_ENGINE).copy()
+        self.root = self.find_root(state)
+        self.reused = self.root.visits
+        self.playouts = 0
+        start = time.perf_counter()
+        deadline = start + time_limit if time_limit != None else None
+        while (playouts == None or self.playouts < playouts) and (deadline == None or time.perf_counter() < deadline):
+            self.playouts += self.iterate(state)
+            if self.root.terminal != None:
+                break
+        self.seconds = time.perf_counter() - start
+        if not self.root.children:
+            return random.choice(state.get_legal_actions())
+        return max(self.root.children.values(), key=lambda child: (child.visits, -CENTER_ORDER.index(child.action))).action
+
+    # One selection, expansion, simulation and backpropagation step. Returns the number of playouts.
+    def iterate(self, state):
+        node = self.root
+        played = []
+        # Selection
+        while node.terminal == None and not node.untried:
+            node = node.uct_child(self.exploration)
+            state.play(node.action)
+            played.append(node.action)
+        # Expansion
+        if node.terminal == None:
+            action = node.untried.pop(0)
+            state.play(action)
+            played.append(action)
+            child = Node(node, action, state)
+            node.children[action] = child
+            node = child
+        # Simulation
+        count = self.batch_size
+        if node.terminal != None:
+            reward = node.terminal * count
+        else:
+            winners = rollout(state.board, state.heights, state.turn, count, self.rng)
+            reward = np.count_nonzero(winners == node.mover) + 0.5 * np.count_nonzero(winners == 0)
+        # Backpropagation, the reward flips between the two players on the way up
+        while node != None:
+            node.visits += count
+            node.reward += reward
+            reward = count - reward
+            node = node.parent
+        for action in reversed(played):
+            state.undo(action)
+        return count
+
+if __name__ == "__main__":
+    import argparse
+    from ai.state import state_from_moves
+
+    parser = argparse.ArgumentParser(description="Run MCTS on one position and report playouts per second")
+    parser.add_argument("moves", nargs="?", default="", help="moves played from the start, columns 1-7")
+    parser.add_argument("--time-limit", type=float, default=1.0)
+    parser.add_argument("--batch-size", type=int, default=MCTS_BATCH_SIZE)
+    args = parser.parse_args()
+
+    mcts = MCTS(batch_size=args.batch_size)
+    move = mcts.search(state_from_moves(args.moves, BITBOARD_ENGINE), time_limit=args.time_limit)
+    print(f"Best move: column {move + 1}, {mcts.playouts} playouts in {mcts.seconds:.2f}s, {mcts.playouts_per_second():.0f} playouts/s")
+    for action, child in sorted(mcts.root.children.items()):
+        print(f"column {action + 1}: {child.visits} playouts, {child.reward / child.visits:.3f} score")
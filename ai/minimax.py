@@ -1,39 +1,141 @@
 """
   minimax.py
   Minimax algorithm implementation
+  The search plays and undoes moves on the state it is given, so the state is unchanged when it returns
 """
 
 import math
+import time
+from ai.transposition import EXACT, LOWER_BOUND, UPPER_BOUND
 from utils import *
 
-def minimax(state, alpha=-math.inf, beta=math.inf, depth=2):
-    if state.is_winning(YELLOW_NUM):
+# How many nodes are visited between checks of the clock
+TIME_CHECK_INTERVAL = 1024
+
+# Raised inside the search when the deadline passes or the search is stopped, the state it was searching is left mid-search
+class SearchTimeout(Exception):
+    pass
+
+# Everything a search shares between nodes. Any field left as None is skipped.
+class SearchContext:
+    def __init__(self, tt=None, orderer=None, deadline=None, stats=None, stop=None):
+        self.tt = tt
+        self.orderer = orderer
+        self.deadline = deadline # time.perf_counter() value after which the search is abandoned
+        self.stats = stats # SearchStats to fill in, see ai/stats.py
+        self.stop = stop # threading.Event another thread can set to abandon the search
+        self.nodes = 0
+        self.max_nodes = None # Value of nodes after which the search is abandoned
+        self.depth = None # Depth the root is being searched to, for progress reports
+
+    # Checked every TIME_CHECK_INTERVAL nodes
+    def should_stop(self):
+        if self.stop is not None and self.stop.is_set():
+            return True
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            return True
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+def minimax(state, alpha=-math.inf, beta=math.inf, depth=2, context=None, ply=0):
+    stats = None
+    if context is not None:
+        context.nodes += 1
+        if context.nodes % TIME_CHECK_INTERVAL == 0 and context.should_stop():
+            raise SearchTimeout()
+        stats = context.stats
+        if stats is not None:
+            stats.nodes_per_ply[ply] += 1
+    winner = state.get_winner()
+    if winner == YELLOW_NUM:
         return WIN_SCORE
-    if state.is_winning(RED_NUM):
+    if winner == RED_NUM:
         return -WIN_SCORE
     if state.is_tie():
         return 0
     if depth == 0:
         # Custom value function that counts potential 4-in-a-rows. Potential rows of length 3 are weighted higher than potential rows of length 2
         # Slight preference for piecs in the center
-        return THREE_IN_ROW_MULT * state.count_three_in_row() + TWO_IN_ROW_MULT * state.count_two_in_row() + CENTER_MULT * state.count_center()
+        # (THREE_IN_ROW_MULT * count_three_in_row + TWO_IN_ROW_MULT * count_two_in_row + CENTER_MULT * count_center)
+        if stats is not None:
+            stats.leaf_evaluations += 1
+        return state.evaluate()
     
-    legal_actions = state.get_legal_actions(sort=True)
+    tt = context.tt if context is not None else None
+    orderer = context.orderer if context is not None else None
+
+    # Only entries searched to exactly this depth are used for cutoffs, so the table never changes the result
+    tt_move = None
+    if tt is not None:
+        entry = tt.lookup(state.hash)
+        if stats is not None:
+            stats.tt_probes += 1
+        if entry is not None:
+            tt_depth, tt_flag, tt_value, tt_move = entry
+            if stats is not None:
+                stats.tt_hits += 1
+            if tt_depth == depth:
+                if tt_flag == EXACT:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return tt_value
+                elif tt_flag == LOWER_BOUND:
+                    alpha = max(alpha, tt_value)
+                else:
+                    beta = min(beta, tt_value)
+                if beta <= alpha:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return tt_value
+        window = (alpha, beta)
+
+    if orderer is not None:
+        legal_actions = orderer.order(state, ply, tt_move)
+    else:
+        legal_actions = state.get_legal_actions(sort=True)
+        # Try the best move from the table first
+        if tt_move in legal_actions:
+            legal_actions.remove(tt_move)
+            legal_actions.insert(0, tt_move)
+
+    best_action = None
+    cutoff_index = None
     if state.turn == YELLOW_NUM:
-        max_evaluation = -math.inf
-        for action in legal_actions:
-            evaluation = minimax(state.get_new_state(action), alpha, beta, depth-1)
-            max_evaluation = max(max_evaluation, evaluation)
+        best_evaluation = -math.inf
+        for index, action in enumerate(legal_actions):
+            state.play(action)
+            evaluation = minimax(state, alpha, beta, depth-1, context, ply+1)
+            state.undo(action)
+            if evaluation > best_evaluation:
+                best_evaluation = evaluation
+                best_action = action
             alpha = max(evaluation, alpha)
             if beta <= alpha:
+                cutoff_index = index
                 break
-        return max_evaluation
     else:
-        min_evaluation = math.inf
-        for action in legal_actions:
-            evaluation = minimax(state.get_new_state(action), alpha, beta, depth-1)
-            min_evaluation = min(min_evaluation, evaluation)
+        best_evaluation = math.inf
+        for index, action in enumerate(legal_actions):
+            state.play(action)
+            evaluation = minimax(state, alpha, beta, depth-1, context, ply+1)
+            state.undo(action)
+            if evaluation < best_evaluation:
+                best_evaluation = evaluation
+                best_action = action
             beta = min(evaluation, beta)
             if beta <= alpha:
+                cutoff_index = index
                 break
-        return min_evaluation
+
+    if orderer is not None:
+        orderer.record(state, ply, depth, best_action, cutoff_index)
+    if stats is not None:
+        stats.record_node(index + 1, cutoff_index)
+    if tt is not None:
+        if best_evaluation <= window[0]:
+            flag = UPPER_BOUND
+        elif best_evaluation >= window[1]:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        tt.store(state.hash, depth, flag, best_evaluation, best_action)
+    return best_evaluation
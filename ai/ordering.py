@@ -0,0 +1,89 @@
+"""
+    ordering.py
+    Move ordering strategies for the minimax search
+"""
+
+from utils import YELLOW_NUM, RED_NUM
+
+# Columns from the center outwards, center columns take part in the most windows
+CENTER_ORDER = [3, 2, 4, 1, 5, 0, 6]
+CENTER_RANK = [CENTER_ORDER.index(action) for action in range(7)]
+
+MAX_PLY = 43
+
+class MoveOrderer:
+    def __init__(self):
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.cutoffs = 0 # Interior nodes that ended in a beta cutoff
+        self.first_move_cutoffs = 0 # ... where the cutoff came from the first move tried
+
+    # Share of cutoffs produced by the first move, close to 1 means the ordering is doing its job
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def new_search(self):
+        pass
+
+    # Returns the legal actions in the order they should be searched
+    def order(self, state, ply, tt_move=None):
+        raise NotImplementedError
+
+    # Called after every interior node, cutoff_index is the position of the move that caused a cutoff or None
+    def record(self, state, ply, depth, action, cutoff_index):
+        if cutoff_index is not None:
+            self.cutoffs += 1
+            if cutoff_index == 0:
+                self.first_move_cutoffs += 1
+
+# The original ordering, children sorted by their depth 0 evaluation
+class EvaluationOrderer(MoveOrderer):
+    def order(self, state, ply, tt_move=None):
+        legal_actions = state.get_legal_actions(sort=True)
+        if tt_move in legal_actions:
+            legal_actions.remove(tt_move)
+            legal_actions.insert(0, tt_move)
+        return legal_actions
+
+# Cheap ordering: transposition table move, then killer moves, then history scores, then center first
+class HeuristicOrderer(MoveOrderer):
+    def __init__(self):
+        super().__init__()
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {YELLOW_NUM: [0]*7, RED_NUM: [0]*7}
+
+    # Killers only make sense for the position they were found in, history is halved so it favours recent searches
+    def new_search(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        for player_num in self.history:
+            self.history[player_num] = [score // 2 for score in self.history[player_num]]
+
+    def order(self, state, ply, tt_move=None):
+        killers = self.killers[ply]
+        history = self.history[state.turn]
+
+        def priority(action):
+            if action == tt_move:
+                return (0, 0, 0)
+            if action == killers[0]:
+                return (1, 0, 0)
+            if action == killers[1]:
+                return (2, 0, 0)
+            return (3, -history[action], CENTER_RANK[action])
+
+        return sorted(state.get_legal_actions(), key=priority)
+
+    def record(self, state, ply, depth, action, cutoff_index):
+        super().record(state, ply, depth, action, cutoff_index)
+        if cutoff_index is not None:
+            killers = self.killers[ply]
+            if killers[0] != action:
+                killers[1] = killers[0]
+                killers[0] = action
+            self.history[state.turn][action] += depth * depth
+
+ORDERERS = {
+    "evaluation": EvaluationOrderer,
+    "heuristic": HeuristicOrderer,
+}
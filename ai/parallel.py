@@ -0,0 +1,139 @@
+"""
+    parallel.py
+    Root-parallel minimax: every root action is searched in its own worker process
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from ai.minimax import SearchContext, SearchTimeout
+from ai.ordering import ORDERERS
+from ai.stats import SearchStats
+from ai.transposition import TranspositionTable
+from utils import BOT_DEPTH, BITBOARD_ENGINE, YELLOW_NUM, RED_NUM, WIN_SCORE
+
+# How often, in seconds, the parent checks whether the search was stopped while it waits for the workers
+STOP_POLL_INTERVAL = 0.01
+
+# Search objects of the current worker process, created once by _init_worker so they stay warm between moves.
+# stop is a multiprocessing.Event shared with the parent, set when the search is stopped.
+_worker_context = None
+
+def _init_worker(ordering, stop):
+    global _worker_context
+    _worker_context = SearchContext(tt=TranspositionTable(), orderer=ORDERERS[ordering](), stop=stop)
+
+# Runs in a worker. Returns the evaluation of playing action in state, or None if time_left ran out,
+# with the node count, the time taken and a SearchStats if stats is set.
+def _evaluate_action(state, action, depth, time_left, stats=False):
+    start = time.perf_counter()
+    context = _worker_context
+    context.tt.new_search()
+    context.orderer.new_search()
+    context.nodes = 0
+    context.deadline = start + time_left if time_left is not None else None
+    context.stats = SearchStats() if stats else None
+    state.play(action)
+    try:
+        evaluation = state.get_evaluation(depth=depth, context=context, ply=1)
+    except SearchTimeout:
+        evaluation = None
+    return evaluation, context.nodes, time.perf_counter() - start, context.stats
+
+class ParallelSearcher:
+    def __init__(self, workers=None, ordering="heuristic"):
+        self.workers = workers or os.cpu_count()
+        self.ordering = ordering
+        self.pool = None
+        self.stop = multiprocessing.Event()
+        self.nodes = 0
+
+    # The pool is started on first use and then reused for every later search
+    def start(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.ordering, self.stop))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    # Same contract as Agent.search_root. Raises SearchTimeout if any action could not be searched before the deadline,
+    # or if stop (a threading.Event, like SearchContext.stop) is set, which stops the workers too.
+    # self.nodes is the number of nodes the workers searched, timed out or not. Their statistics are added to stats, if given.
+    def search_root(self, state, depth, deadline=None, stats=None, stop=None):
+        self.start()
+        self.nodes = 0
+        self.stop.clear()
+        legal_actions = state.get_legal_actions()
+        time_left = deadline - time.perf_counter() if deadline is not None else None
+        futures = [self.pool.submit(_evaluate_action, state, action, depth, time_left, stats is not None) for action in legal_actions]
+        # Pass a stop on to the workers while waiting for them
+        if stop is not None:
+            while wait(futures, STOP_POLL_INTERVAL).not_done:
+                if stop.is_set():
+                    self.stop.set()
+                    break
+        results = [future.result() for future in futures]
+        self.nodes = sum(result[1] for result in results)
+        if stats is not None:
+            for action, (evaluation, nodes, seconds, worker_stats) in zip(legal_actions, results):
+                stats.merge(worker_stats)
+                stats.record_root(action, seconds)
+
+        best_action = None
+        best_evaluation = WIN_SCORE+1 if state.turn == RED_NUM else -WIN_SCORE-1
+        for action, (evaluation, nodes, seconds, worker_stats) in zip(legal_actions, results):
+            if evaluation is None:
+                raise SearchTimeout()
+            if state.turn == YELLOW_NUM:
+                if evaluation > best_evaluation:
+                    best_evaluation = evaluation
+                    best_action = action
+            else:
+                if evaluation < best_evaluation:
+                    best_evaluation = evaluation
+                    best_action = action
+        return best_action, best_evaluation
+
+# Time a fixed-depth search of each position with one core and with the pool.
+# Returns per-position timings and whether both picked the same move.
+def measure_speedup(positions, depth, workers=None, engine=BITBOARD_ENGINE):
+    from ai.agent import Agent
+    from ai.state import state_from_moves
+
+    serial = Agent(algorithm="minimax", depth=depth, engine=engine, solver_threshold=None)
+    parallel = Agent(algorithm="minimax", depth=depth, engine=engine, workers=workers or os.cpu_count(), solver_threshold=None)
+    parallel.parallel.start()
+    report = {"depth": depth, "workers": parallel.parallel.workers, "positions": []}
+    try:
+        for moves in positions:
+            state = state_from_moves(moves, engine)
+            start = time.perf_counter()
+            serial_move = serial.get_move(state)
+            serial_time = time.perf_counter() - start
+            start = time.perf_counter()
+            parallel_move = parallel.get_move(state)
+            parallel_time = time.perf_counter() - start
+            report["positions"].append({
+                "moves": moves,
+                "serial_time": serial_time,
+                "parallel_time": parallel_time,
+                "speedup": serial_time / parallel_time,
+                "same_move": serial_move == parallel_move,
+            })
+    finally:
+        parallel.close()
+    serial_total = sum(position["serial_time"] for position in report["positions"])
+    parallel_total = sum(position["parallel_time"] for position in report["positions"])
+    report["speedup"] = serial_total / parallel_total
+    return report
+
+if __name__ == "__main__":
+    from ai.positions import TEST_POSITIONS
+    report = measure_speedup(TEST_POSITIONS, BOT_DEPTH + 2)
+    for position in report["positions"]:
+        print(f"{position['moves'] or '(start)':<32} serial {position['serial_time']:7.3f}s  parallel {position['parallel_time']:7.3f}s  "
+              f"x{position['speedup']:.2f}{'' if position['same_move'] else '  MOVE DIFFERS'}")
+    print(f"Overall speedup with {report['workers']} workers: x{report['speedup']:.2f}")
@@ -0,0 +1,67 @@
+"""
+    ponder.py
+    Pondering: while the opponent thinks, a background thread searches the agent's reply to each move they could make
+    The agent's transposition table is shared, so even replies that were not reached make the real search cheaper
+"""
+
+import threading
+from ai.minimax import SearchTimeout
+from ai.ordering import CENTER_ORDER
+from ai.state import convert_state
+
+class Ponderer:
+    def __init__(self, agent):
+        self.agent = agent
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.state = None
+        self.results = {} # Opponent action -> the agent's SearchResult for the position after it
+
+    # Start pondering on state, a position where the opponent is to move
+    def start(self, state):
+        self.stop()
+        self.state = convert_state(state, self.agent.engine).copy()
+        self.results = {}
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # Stop the thread, the agent can be used again once this returns
+    def stop(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    # The opponent's most likely moves first: the best move the agent's last search found for them, then center first
+    def predicted_actions(self):
+        actions = [action for action in CENTER_ORDER if self.state.is_legal_action(action)]
+        entry = self.agent.tt.lookup(self.state.hash) if self.agent.tt is not None else None
+        if entry is not None and entry[3] in actions:
+            actions.remove(entry[3])
+            actions.insert(0, entry[3])
+        return actions
+
+    def run(self):
+        self.agent.context.stop = self.stop_event
+        try:
+            for action in self.predicted_actions():
+                child = self.state.get_new_state(action)
+                if child.get_winner() != None or child.is_tie():
+                    continue
+                try:
+                    result = self.agent.search(child)
+                except SearchTimeout:
+                    return
+                # A time limited search returns what it has when stopped, which is not what it would have played
+                if self.stop_event.is_set():
+                    return
+                self.results[action] = result
+        finally:
+            self.agent.context.stop = None
+
+    # Stop pondering and return the agent's move after the opponent played action, None if that position was not searched in time
+    def get_move(self, action):
+        self.stop()
+        result = self.results.get(action)
+        return result.move if result != None else None
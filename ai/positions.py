@@ -0,0 +1,25 @@
+"""
+    positions.py
+    Fixed set of test positions used for benchmarking and verification
+    Positions are move strings, one digit per move from 1 (leftmost column) to 7, starting with yellow
+"""
+
+OPENING_POSITIONS = [
+    "",
+    "47",
+    "577445",
+]
+
+MIDGAME_POSITIONS = [
+    "4575544457",
+    "22757151552722",
+    "465746645545233235",
+]
+
+ENDGAME_POSITIONS = [
+    "2143425445566754222533",
+    "21574345443321223324425553",
+    "661555466523244475547677722246",
+]
+
+TEST_POSITIONS = OPENING_POSITIONS + MIDGAME_POSITIONS + ENDGAME_POSITIONS
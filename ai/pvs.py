@@ -0,0 +1,167 @@
+"""
+  pvs.py
+  Principal variation search, a negamax form of minimax with null-window searches and aspiration windows
+  Scores are from the point of view of the player to move, i.e. the minimax score for yellow and its negation for red
+"""
+
+import math
+import time
+from ai.minimax import SearchTimeout, TIME_CHECK_INTERVAL
+from ai.transposition import EXACT, LOWER_BOUND, UPPER_BOUND
+from utils import BOT_DEPTH, BITBOARD_ENGINE, YELLOW_NUM, WIN_SCORE
+
+# Finite bounds so null windows around them stay valid (scores are integers within +-WIN_SCORE)
+INFINITY = WIN_SCORE + 1
+
+# Half width of the first aspiration window around the previous iteration's score
+ASPIRATION_WINDOW = 50
+
+def pvs(state, alpha, beta, depth, context, ply=0):
+    context.nodes += 1
+    if context.nodes % TIME_CHECK_INTERVAL == 0 and context.should_stop():
+        raise SearchTimeout()
+    stats = context.stats
+    if stats is not None:
+        stats.nodes_per_ply[ply] += 1
+    winner = state.get_winner()
+    if winner is not None:
+        return WIN_SCORE if winner == state.turn else -WIN_SCORE
+    if state.is_tie():
+        return 0
+    if depth == 0:
+        if stats is not None:
+            stats.leaf_evaluations += 1
+        return state.evaluate() if state.turn == YELLOW_NUM else -state.evaluate()
+
+    tt = context.tt
+    orderer = context.orderer
+
+    # Only entries searched to exactly this depth are used for cutoffs, so the table never changes the result
+    tt_move = None
+    if tt is not None:
+        entry = tt.lookup(state.hash)
+        if stats is not None:
+            stats.tt_probes += 1
+        if entry is not None:
+            tt_depth, tt_flag, tt_value, tt_move = entry
+            if stats is not None:
+                stats.tt_hits += 1
+            if tt_depth == depth:
+                if tt_flag == EXACT:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return tt_value
+                elif tt_flag == LOWER_BOUND:
+                    alpha = max(alpha, tt_value)
+                else:
+                    beta = min(beta, tt_value)
+                if beta <= alpha:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return tt_value
+    window = (alpha, beta)
+
+    legal_actions = orderer.order(state, ply, tt_move)
+    best_action = None
+    best_evaluation = -math.inf
+    cutoff_index = None
+    for index, action in enumerate(legal_actions):
+        state.play(action)
+        if index == 0:
+            evaluation = -pvs(state, -beta, -alpha, depth-1, context, ply+1)
+        else:
+            # Prove the move is no better than the best so far with a null window, search it fully only if that fails
+            evaluation = -pvs(state, -alpha-1, -alpha, depth-1, context, ply+1)
+            if alpha < evaluation < beta:
+                evaluation = -pvs(state, -beta, -alpha, depth-1, context, ply+1)
+        state.undo(action)
+        if evaluation > best_evaluation:
+            best_evaluation = evaluation
+            best_action = action
+        alpha = max(evaluation, alpha)
+        if beta <= alpha:
+            cutoff_index = index
+            break
+
+    orderer.record(state, ply, depth, best_action, cutoff_index)
+    if stats is not None:
+        stats.record_node(index + 1, cutoff_index)
+    if tt is not None:
+        if best_evaluation <= window[0]:
+            flag = UPPER_BOUND
+        elif best_evaluation >= window[1]:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        tt.store(state.hash, depth, flag, best_evaluation, best_action)
+    return best_evaluation
+
+# Search every root action to the given depth inside the window (alpha, beta).
+# Ties go to the lowest column, like Agent.search_root, so a lower column only has to equal the best score and a higher one has to beat it.
+# The result is exact only if the score lands strictly inside the window.
+def pvs_root(state, depth, context, alpha=-INFINITY, beta=INFINITY, first_action=None):
+    legal_actions = context.orderer.order(state, 0, first_action)
+    stats = context.stats
+    best_action = None
+    best_evaluation = -math.inf
+    for action in legal_actions:
+        if stats is not None:
+            start = time.perf_counter()
+        state.play(action)
+        if best_action is None:
+            evaluation = -pvs(state, -beta, -alpha, depth, context, 1)
+        else:
+            bound = max(alpha, best_evaluation - 1 if action < best_action else best_evaluation)
+            evaluation = -pvs(state, -bound-1, -bound, depth, context, 1)
+            if bound < evaluation < beta:
+                evaluation = -pvs(state, -beta, -bound, depth, context, 1)
+        state.undo(action)
+        if stats is not None:
+            stats.record_root(action, time.perf_counter() - start)
+        if evaluation > best_evaluation or (evaluation == best_evaluation and action < best_action):
+            best_evaluation = evaluation
+            best_action = action
+        if best_evaluation >= beta:
+            break
+    return best_action, best_evaluation
+
+# Root search with aspiration windows: start with a narrow window around guess and widen it until the score lands inside
+def aspiration_search(state, depth, context, guess=None, first_action=None):
+    delta = ASPIRATION_WINDOW
+    while True:
+        if guess is None or delta >= WIN_SCORE:
+            alpha, beta = -INFINITY, INFINITY
+        else:
+            alpha, beta = max(guess - delta, -INFINITY), min(guess + delta, INFINITY)
+        best_action, best_evaluation = pvs_root(state, depth, context, alpha, beta, first_action)
+        if alpha < best_evaluation < beta:
+            return best_action, best_evaluation
+        first_action = best_action
+        delta *= 4
+
+# Compare PVS against the plain minimax Agent at a fixed depth on each position
+def verify(positions, depth, engine=BITBOARD_ENGINE):
+    from ai.agent import Agent
+    from ai.state import state_from_moves
+
+    results = []
+    for moves in positions:
+        state = state_from_moves(moves, engine)
+        reference = Agent(algorithm="minimax", depth=depth, engine=engine, solver_threshold=None).search(state)
+        result = Agent(algorithm="pvs", depth=depth, engine=engine, solver_threshold=None).search(state)
+        results.append({
+            "moves": moves,
+            "same_move": reference.move == result.move,
+            "same_evaluation": reference.evaluation == result.evaluation,
+            "minimax_nodes": reference.nodes,
+            "pvs_nodes": result.nodes,
+        })
+    return results
+
+if __name__ == "__main__":
+    from ai.positions import TEST_POSITIONS
+    results = verify(TEST_POSITIONS, BOT_DEPTH + 2)
+    for result in results:
+        print(f"{result['moves'] or '(start)':<32} minimax {result['minimax_nodes']:8d} nodes  pvs {result['pvs_nodes']:8d} nodes"
+              f"{'' if result['same_move'] and result['same_evaluation'] else '  MISMATCH'}")
+    print(f"Nodes: minimax {sum(r['minimax_nodes'] for r in results)}, pvs {sum(r['pvs_nodes'] for r in results)}")
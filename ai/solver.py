@@ -0,0 +1,183 @@
+"""
+    solver.py
+    Contains the Solver class which computes the exact game-theoretic value of a position on bitboards
+
+    Scores follow the usual convention for Connect 4 solvers, from the point of view of the player to move:
+    0 is a draw, a positive score means the player to move wins, and a negative score means they lose.
+    The further from zero, the sooner the game is decided: a win with the player's last piece scores 1,
+    and each piece earlier scores one more.
+"""
+
+from ai.bitboard import ACTIONS, COL_HEIGHT, FULL_MASK, bottom_mask, column_mask
+from ai.minimax import SearchTimeout, TIME_CHECK_INTERVAL
+from ai.ordering import CENTER_ORDER
+from ai.windows import ROWS, COLS
+
+CELLS = ROWS * COLS
+BOTTOM_MASK = sum(bottom_mask(col) for col in ACTIONS)
+COLUMN_MASKS = [column_mask(col) for col in ACTIONS]
+
+# Upper bounds kept per position, the table is emptied when it reaches this many entries
+SOLVER_TABLE_SIZE = 2_000_000
+
+# Cells where pieces would complete a four-in-a-row for the player owning position
+def winning_cells(position, mask):
+    # Vertical
+    cells = (position << 1) & (position << 2) & (position << 3)
+    # Horizontal and the two diagonals
+    for shift in (COL_HEIGHT, COL_HEIGHT-1, COL_HEIGHT+1):
+        pair = (position << shift) & (position << 2*shift)
+        cells |= pair & (position << 3*shift)
+        cells |= pair & (position >> shift)
+        pair = (position >> shift) & (position >> 2*shift)
+        cells |= pair & (position << shift)
+        cells |= pair & (position >> 3*shift)
+    return cells & (FULL_MASK ^ mask)
+
+def possible_moves(mask):
+    return (mask + BOTTOM_MASK) & FULL_MASK
+
+def can_win_next(current, mask):
+    return winning_cells(current, mask) & possible_moves(mask) != 0
+
+class Solver:
+    def __init__(self):
+        self.table = {}
+        self.nodes = 0
+        # SearchContext the nodes are also counted in, and whose deadline and stop event end the solve with SearchTimeout
+        self.context = None
+
+    def reset(self):
+        self.table = {}
+        self.nodes = 0
+
+    # Exact score of a BitboardState. With weak=True only the sign (win, draw or loss) is exact.
+    def solve(self, state, weak=False):
+        return self.solve_position(state.current, state.mask, sum(state.heights), weak)
+
+    def solve_position(self, current, mask, moves, weak=False):
+        if can_win_next(current, mask):
+            return (CELLS + 1 - moves) // 2
+        low = -((CELLS - moves) // 2)
+        high = (CELLS + 1 - moves) // 2
+        if weak:
+            low = -1
+            high = 1
+
+        # Narrow [low, high] with null-window probes, trying small absolute scores first since they are cheaper to prove
+        while low < high:
+            probe = low + (high - low) // 2
+            if probe <= 0 and _half(low) < probe:
+                probe = _half(low)
+            elif probe >= 0 and _half(high) > probe:
+                probe = _half(high)
+            score = self.negamax(current, mask, moves, probe, probe + 1)
+            if score <= probe:
+                high = score
+            else:
+                low = score
+        return low
+
+    # Returns (action, score) for a perfect move, center columns first among equally good moves
+    def best_action(self, state):
+        score = self.solve(state)
+        best_action = None
+        best_score = None
+        for action in CENTER_ORDER:
+            if state.is_legal_action(action):
+                action_score = self.solve_action(state, action)
+                if best_score is None or action_score > best_score:
+                    best_action = action
+                    best_score = action_score
+                if best_score == score:
+                    break
+        return best_action, best_score
+
+    # Score of the position after the player to move plays action
+    def solve_action(self, state, action, weak=False):
+        move = possible_moves(state.mask) & COLUMN_MASKS[action]
+        moves = sum(state.heights)
+        if winning_cells(state.current, state.mask) & move:
+            return (CELLS + 1 - moves) // 2
+        return -self.solve_position(state.current ^ state.mask, state.mask | move, moves + 1, weak)
+
+    # Alpha-beta search that assumes the player to move cannot win immediately
+    def negamax(self, current, mask, moves, alpha, beta):
+        self.nodes += 1
+        context = self.context
+        if context is not None:
+            context.nodes += 1
+            if context.nodes % TIME_CHECK_INTERVAL == 0 and context.should_stop():
+                raise SearchTimeout()
+        opponent = current ^ mask
+        possible = possible_moves(mask)
+        opponent_wins = winning_cells(opponent, mask)
+
+        # Moves that do not hand the opponent an immediate win
+        forced = possible & opponent_wins
+        if forced:
+            if forced & (forced - 1):
+                # Two threats at once, the game is lost
+                return -((CELLS - moves) // 2)
+            possible = forced
+        non_losing = possible & ~(opponent_wins >> 1)
+        if non_losing == 0:
+            return -((CELLS - moves) // 2)
+        if moves >= CELLS - 2:
+            return 0
+
+        # The opponent cannot win with their next move, so this is a lower bound
+        low = -((CELLS - 2 - moves) // 2)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+        # Neither can we, so this is an upper bound
+        high = (CELLS - 1 - moves) // 2
+        key = current + mask
+        stored = self.table.get(key)
+        if stored is not None:
+            high = stored
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+
+        # Try the moves that create the most new threats first, then center first
+        candidates = []
+        for col in CENTER_ORDER:
+            move = non_losing & COLUMN_MASKS[col]
+            if move:
+                candidates.append((-winning_cells(current | move, mask).bit_count(), len(candidates), move))
+        candidates.sort()
+
+        for _, _, move in candidates:
+            score = -self.negamax(opponent, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        if len(self.table) >= SOLVER_TABLE_SIZE:
+            self.table.clear()
+        self.table[key] = alpha
+        return alpha
+
+# Integer division rounding towards zero
+def _half(score):
+    return -((-score) // 2) if score < 0 else score // 2
+
+# Number of moves left in the game, including the last one, when both sides play perfectly from a position with this score
+def distance_to_end(score, moves):
+    if score == 0:
+        return CELLS - moves
+    # Pieces on the board before the winning one is played, which has the winner's parity
+    if score > 0:
+        before_win = CELLS + 1 - 2 * score
+        parity = moves % 2
+    else:
+        before_win = CELLS + 1 + 2 * score
+        parity = (moves + 1) % 2
+    if before_win % 2 != parity:
+        before_win -= 1
+    return before_win - moves + 1
@@ -3,19 +3,41 @@
     Contains the GameState class which keeps track of the internal game state
 """
 
-import numpy as np
 from ai.minimax import minimax
-from utils import YELLOW_NUM, RED_NUM
+from ai.bitboard import BitboardState
+from ai.incremental import IncrementalEvaluator
+from ai.transposition import ZOBRIST, ZOBRIST_TURN, compute_hash
+from utils import YELLOW_NUM, RED_NUM, ARRAY_ENGINE, BITBOARD_ENGINE
 
 ACTIONS = [0, 1, 2, 3, 4, 5, 6]
 
 class GameState:
-    def __init__(self, board, turn):
+    def __init__(self, board, turn, hash=None, heights=None, moves=None):
         self.board = board
         self.turn = turn
+        # Zobrist hash of the position, updated incrementally by get_new_state and play/undo
+        self.hash = compute_hash(board, turn) if hash is None else hash
+        # Number of pieces in each column
+        self.heights = [int((board[:, j] != 0).sum()) for j in ACTIONS] if heights is None else heights
+        # Columns played since the state was created from a board, the last one is where a new four can appear
+        self.moves = [] if moves is None else moves
+        # Optional running score, updated by play/undo
+        self.evaluator = None
+
+    def copy(self):
+        return GameState(self.board.copy(), self.turn, self.hash, self.heights.copy(), self.moves.copy())
+
+    # Keep the depth 0 score up to date through play/undo so evaluate() is O(1)
+    def attach_evaluator(self):
+        self.evaluator = IncrementalEvaluator()
+        for i in range(self.board.shape[0]):
+            for j in range(self.board.shape[1]):
+                if self.board[i][j] != 0:
+                    self.evaluator.add(i, j, int(self.board[i][j]))
 
     def change_turn(self):
         self.turn = RED_NUM if self.turn == YELLOW_NUM else YELLOW_NUM
+        self.hash ^= ZOBRIST_TURN
     
     def is_winning(self, player_num):
         # check horizontals
@@ -44,8 +66,39 @@ class GameState:
 
         return False
 
+    # Check only the four lines through the last piece played
+    def is_winning_move(self):
+        action = self.moves[-1]
+        i = self.board.shape[0] - self.heights[action]
+        player_num = self.board[i, action]
+        for di, dj in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            count = 1
+            for sign in (1, -1):
+                row, col = i + sign*di, action + sign*dj
+                while 0 <= row < self.board.shape[0] and 0 <= col < self.board.shape[1] and self.board[row, col] == player_num:
+                    count += 1
+                    row += sign*di
+                    col += sign*dj
+            if count >= 4:
+                return True
+        return False
+
+    # Returns the player with four in a row, or None. Falls back to scanning the whole board when the last move is unknown.
+    # The winner is the owner of the last piece, not worked out from turn, which Connect4Game leaves on the winner.
+    def get_winner(self):
+        if self.moves:
+            if self.is_winning_move():
+                action = self.moves[-1]
+                return int(self.board[self.board.shape[0] - self.heights[action], action])
+            return None
+        if self.is_winning(YELLOW_NUM):
+            return YELLOW_NUM
+        if self.is_winning(RED_NUM):
+            return RED_NUM
+        return None
+
     def is_tie(self):
-        return np.count_nonzero(self.board==0) == 0
+        return self.board.all()
     
     def is_legal_action(self, action):
         return self.board[0][action] == 0
@@ -59,21 +112,57 @@ class GameState:
             return legal_actions
         
         # If sort == True, sort actions by depth 0 evaluation
-        return sorted(legal_actions, key=lambda x: minimax(self.get_new_state(x), depth=0))
+        return sorted(legal_actions, key=self.get_sort_key)
+
+    def get_sort_key(self, action):
+        self.play(action)
+        evaluation = minimax(self, depth=0)
+        self.undo(action)
+        return evaluation
     
     def get_new_state(self, action):
         if self.is_legal_action(action):
             new_board = self.board.copy()
-            for i in range(new_board.shape[0]-1, -1, -1):
-                if new_board[i][action] == 0:
-                    new_board[i][action] = self.turn
-                    break
-            return GameState(new_board, YELLOW_NUM if self.turn == RED_NUM else RED_NUM)
+            i = new_board.shape[0]-1 - self.heights[action]
+            new_board[i][action] = self.turn
+            new_hash = self.hash ^ ZOBRIST[self.turn][i][action] ^ ZOBRIST_TURN
+            new_heights = self.heights.copy()
+            new_heights[action] += 1
+            return GameState(new_board, YELLOW_NUM if self.turn == RED_NUM else RED_NUM, new_hash, new_heights, self.moves + [action])
         return self
+
+    # In-place version of get_new_state used by the search. The action must be legal.
+    def play(self, action):
+        i = self.board.shape[0]-1 - self.heights[action]
+        self.board[i][action] = self.turn
+        self.hash ^= ZOBRIST[self.turn][i][action]
+        self.heights[action] += 1
+        self.moves.append(action)
+        if self.evaluator is not None:
+            self.evaluator.add(i, action, self.turn)
+        self.change_turn()
+
+    # Take back the last piece played in the given column
+    def undo(self, action):
+        self.change_turn()
+        self.heights[action] -= 1
+        self.moves.pop()
+        i = self.board.shape[0]-1 - self.heights[action]
+        self.board[i][action] = 0
+        self.hash ^= ZOBRIST[self.turn][i][action]
+        if self.evaluator is not None:
+            self.evaluator.remove(i, action, self.turn)
     
-    def get_evaluation(self, depth=2):
-        return minimax(self, depth=depth) # Potentially substitute for different algorithm
+    def get_evaluation(self, depth=2, context=None, ply=0):
+        return minimax(self, depth=depth, context=context, ply=ply) # Potentially substitute for different algorithm
     
+    # Depth 0 score, same value as the count_* functions combined but computed in one vectorized pass
+    def evaluate(self):
+        if self.evaluator is not None:
+            return self.evaluator.evaluate()
+        from ai.evaluation import evaluate_boards
+        return evaluate_boards(self.board)
+
     def count_three_in_row(self):
         count = 0
         # Horizontal
@@ -221,3 +310,31 @@ class GameState:
 
         return count
     
+
+# Create the starting state for the given engine
+def new_state(engine=ARRAY_ENGINE):
+    if engine == BITBOARD_ENGINE:
+        return BitboardState(0, 0, YELLOW_NUM)
+    # NumPy is only imported for the array engine, the bitboard engine runs without it
+    import numpy as np
+    return GameState(np.zeros((6, 7)), YELLOW_NUM)
+
+# Play a move string (digits 1-7, one per move) from the starting position
+def state_from_moves(moves, engine=ARRAY_ENGINE):
+    state = new_state(engine)
+    for move in moves:
+        action = int(move) - 1
+        if action not in ACTIONS or not state.is_legal_action(action):
+            raise ValueError(f"Illegal move {move} in {moves}")
+        state.play(action)
+    return state
+
+# Convert a state to the representation used by the given engine
+def convert_state(state, engine):
+    if engine == BITBOARD_ENGINE:
+        if isinstance(state, BitboardState):
+            return state
+        return BitboardState.from_board(state.board, state.turn)
+    if isinstance(state, GameState):
+        return state
+    return GameState(state.board.copy(), state.turn)
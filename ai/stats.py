@@ -0,0 +1,138 @@
+"""
+    stats.py
+    Optional counters for a single search. The search only collects them when its SearchContext has a SearchStats,
+    otherwise each node pays for one attribute check.
+
+    python -m ai.stats 4575544457 --depth 6 --profile    stats for one search, plus the cProfile report
+"""
+
+from ai.ordering import MAX_PLY
+
+class SearchStats:
+    def __init__(self):
+        self.source = "search" # "book", "cache" or "solver" when the move did not come from a search
+        self.nodes_per_ply = [0] * (MAX_PLY + 1) # Ply 0 is the root, its children are ply 1
+        self.leaf_evaluations = 0
+        self.interior_nodes = 0 # Nodes whose children were searched
+        self.children_searched = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0 # Probes that found an entry for the position
+        self.tt_cutoffs = 0 # ... that ended the node without searching it
+        self.iterations = [] # (depth, nodes, seconds) for every iteration that finished
+        self.root_times = {} # Seconds spent searching each root action, over all iterations
+        self.solver_nodes = 0
+        self.seconds = 0.0
+
+    @property
+    def nodes(self):
+        return sum(self.nodes_per_ply)
+
+    # Called after the children of a node are searched, searched is how many were and cutoff_index as in MoveOrderer.record
+    def record_node(self, searched, cutoff_index):
+        self.interior_nodes += 1
+        self.children_searched += searched
+        if cutoff_index is not None:
+            self.cutoffs += 1
+            if cutoff_index == 0:
+                self.first_move_cutoffs += 1
+
+    def record_root(self, action, seconds):
+        self.root_times[action] = self.root_times.get(action, 0.0) + seconds
+
+    # Add the node counters of another search, e.g. one run by a worker process
+    def merge(self, other):
+        self.nodes_per_ply = [a + b for a, b in zip(self.nodes_per_ply, other.nodes_per_ply)]
+        self.leaf_evaluations += other.leaf_evaluations
+        self.interior_nodes += other.interior_nodes
+        self.children_searched += other.children_searched
+        self.cutoffs += other.cutoffs
+        self.first_move_cutoffs += other.first_move_cutoffs
+        self.tt_probes += other.tt_probes
+        self.tt_hits += other.tt_hits
+        self.tt_cutoffs += other.tt_cutoffs
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    # Average number of children searched per interior node
+    def branching_factor(self):
+        return self.children_searched / self.interior_nodes if self.interior_nodes else 0.0
+
+    # Growth in nodes from one iteration to the next, only known with iterative deepening
+    def effective_branching_factor(self):
+        ratios = [nodes / previous[1] for previous, (depth, nodes, seconds) in zip(self.iterations, self.iterations[1:]) if previous[1]]
+        return sum(ratios) / len(ratios) if ratios else None
+
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def to_dict(self):
+        last_ply = max((ply for ply, nodes in enumerate(self.nodes_per_ply) if nodes), default=-1)
+        return {
+            "source": self.source,
+            "seconds": self.seconds,
+            "nodes": self.nodes,
+            "solver_nodes": self.solver_nodes,
+            "nodes_per_ply": self.nodes_per_ply[:last_ply + 1],
+            "leaf_evaluations": self.leaf_evaluations,
+            "interior_nodes": self.interior_nodes,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+            "branching_factor": self.branching_factor(),
+            "effective_branching_factor": self.effective_branching_factor(),
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "tt_cutoffs": self.tt_cutoffs,
+            "tt_hit_rate": self.tt_hit_rate(),
+            "iterations": self.iterations,
+            "root_times": self.root_times,
+        }
+
+    def report(self):
+        stats = self.to_dict()
+        if stats["source"] in ("book", "cache"):
+            return f"{stats['source']} move in {stats['seconds']:.3f}s"
+        if stats["source"] == "solver":
+            return f"solver: {stats['solver_nodes']} nodes in {stats['seconds']:.3f}s"
+        lines = [
+            f"{stats['source']}: {stats['nodes']} nodes in {stats['seconds']:.3f}s",
+            "nodes per ply: " + " ".join(str(nodes) for nodes in stats["nodes_per_ply"]),
+            f"leaf evaluations: {stats['leaf_evaluations']}",
+            f"cutoffs: {stats['cutoffs']} of {stats['interior_nodes']} interior nodes, {stats['first_move_cutoff_rate']:.1%} on the first move",
+            f"branching factor: {stats['branching_factor']:.2f}",
+            f"transposition table: {stats['tt_hits']} hits in {stats['tt_probes']} probes ({stats['tt_hit_rate']:.1%}), {stats['tt_cutoffs']} cutoffs",
+        ]
+        if stats["effective_branching_factor"] is not None:
+            lines.append(f"effective branching factor: {stats['effective_branching_factor']:.2f}")
+        for depth, nodes, seconds in stats["iterations"]:
+            lines.append(f"depth {depth}: {nodes} nodes, {seconds:.3f}s")
+        for action, seconds in sorted(stats["root_times"].items()):
+            lines.append(f"column {action + 1}: {seconds:.3f}s")
+        return "\n".join(lines)
+
+if __name__ == "__main__":
+    import argparse
+    import cProfile
+    import pstats
+    from ai.agent import Agent
+    from ai.state import state_from_moves
+    from utils import BOT_DEPTH, BITBOARD_ENGINE
+
+    parser = argparse.ArgumentParser(description="Search one position and print the search statistics")
+    parser.add_argument("moves", nargs="?", default="", help="moves played from the start, columns 1-7")
+    parser.add_argument("--algorithm", default="minimax")
+    parser.add_argument("--depth", type=int, default=BOT_DEPTH)
+    parser.add_argument("--time-limit", type=float, default=None)
+    parser.add_argument("--engine", default=BITBOARD_ENGINE)
+    parser.add_argument("--profile", action="store_true", help="also run the search under cProfile")
+    args = parser.parse_args()
+
+    agent = Agent(algorithm=args.algorithm, depth=args.depth, engine=args.engine, time_limit=args.time_limit, solver_threshold=None)
+    profiler = cProfile.Profile() if args.profile else None
+    result = agent.search(state_from_moves(args.moves, args.engine), stats=True, profiler=profiler)
+    print(f"Best move: column {result.move + 1}, evaluation {result.evaluation}")
+    print(result.stats.report())
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
@@ -0,0 +1,59 @@
+"""
+    transposition.py
+    Zobrist hashing and the transposition table used by minimax
+"""
+
+import random
+from ai.windows import ROWS, COLS
+from utils import YELLOW_NUM, RED_NUM, TT_SIZE_MB
+
+# Random keys for every (player, row, col), plus one that is xored in when it is red's turn
+_rng = random.Random(0xC4)
+ZOBRIST = {player_num: [[_rng.getrandbits(64) for j in range(COLS)] for i in range(ROWS)] for player_num in (YELLOW_NUM, RED_NUM)}
+ZOBRIST_TURN = _rng.getrandbits(64)
+
+def compute_hash(board, turn):
+    h = ZOBRIST_TURN if turn == RED_NUM else 0
+    for i in range(ROWS):
+        for j in range(COLS):
+            if board[i][j] != 0:
+                h ^= ZOBRIST[int(board[i][j])][i][j]
+    return h
+
+# Bound types
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Rough size in bytes of one stored entry (the tuple plus its int objects)
+ENTRY_SIZE = 160
+
+class TranspositionTable:
+    def __init__(self, size_mb=TT_SIZE_MB):
+        # Round the number of slots down to a power of two so the index is a mask
+        slots = max(1, int(size_mb * 2**20) // ENTRY_SIZE)
+        self.size = 1 << (slots.bit_length() - 1)
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    # Called before every search, so entries left over from earlier moves can be replaced first
+    def new_search(self):
+        self.generation += 1
+
+    # Returns (depth, flag, value, move) or None
+    def lookup(self, key):
+        entry = self.entries[key & (self.size-1)]
+        if entry is not None and entry[0] == key:
+            return entry[1:5]
+        return None
+
+    # Depth-preferred replacement: keep the deeper entry unless it is from an older search
+    def store(self, key, depth, flag, value, move):
+        index = key & (self.size-1)
+        old = self.entries[index]
+        if old is None or old[5] != self.generation or depth >= old[1]:
+            self.entries[index] = (key, depth, flag, value, move, self.generation)
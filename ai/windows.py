@@ -0,0 +1,34 @@
+"""
+    windows.py
+    Precomputed table of every four-cell window on the board
+"""
+
+ROWS = 6
+COLS = 7
+
+def _build_windows():
+    windows = []
+    # Horizontal
+    for i in range(ROWS):
+        for j in range(COLS-3):
+            windows.append(((i, j), (i, j+1), (i, j+2), (i, j+3)))
+
+    # Vertical
+    for j in range(COLS):
+        for i in range(ROWS-3):
+            windows.append(((i, j), (i+1, j), (i+2, j), (i+3, j)))
+
+    # Positive diagonal
+    for i in range(3, ROWS):
+        for j in range(COLS-3):
+            windows.append(((i, j), (i-1, j+1), (i-2, j+2), (i-3, j+3)))
+
+    # Negative diagonal
+    for i in range(ROWS-3):
+        for j in range(COLS-3):
+            windows.append(((i, j), (i+1, j+1), (i+2, j+2), (i+3, j+3)))
+
+    return windows
+
+# The 69 windows as tuples of (row, col) cells, in the same order the GameState scans them
+WINDOWS = _build_windows()
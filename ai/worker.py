@@ -0,0 +1,61 @@
+"""
+    worker.py
+    Runs an Agent's search on a background thread so a game loop can keep drawing and handling events while it thinks
+"""
+
+import threading
+from ai.minimax import SearchTimeout
+
+class SearchWorker:
+    def __init__(self, agent):
+        self.agent = agent
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.move = None
+        self.error = None # Exception the last search failed with, if any
+
+    # Start searching for the agent's move in state, poll done() to find out when move is ready
+    def start(self, state):
+        self.cancel()
+        self.move = None
+        self.error = None
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, args=(state,), daemon=True)
+        self.thread.start()
+
+    def run(self, state):
+        self.agent.context.stop = self.stop_event
+        try:
+            self.move = self.agent.get_move(state)
+        except SearchTimeout:
+            self.move = None
+        except Exception as error:
+            # Kept for the caller to report, starting the same search again would only fail the same way
+            self.move = None
+            self.error = error
+        finally:
+            self.agent.context.stop = None
+
+    # True from start() until the move is taken or the search is cancelled
+    def is_busy(self):
+        return self.thread is not None
+
+    def done(self):
+        return self.thread is not None and not self.thread.is_alive()
+
+    # Once done(), returns the move and frees the worker for the next search. The move is None if the search failed, see error.
+    def take_move(self):
+        self.thread.join()
+        self.thread = None
+        return self.move
+
+    # Abandon the search, returns once the agent can be used again
+    def cancel(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    # (depth being searched, nodes searched so far), read while the search runs so only approximately in step
+    def progress(self):
+        return self.agent.context.depth, self.agent.context.nodes
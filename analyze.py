@@ -0,0 +1,271 @@
+"""
+  analyze.py
+  Batch analysis of large sets of positions, streamed to a JSON lines file in input order
+
+  Positions are read in chunks from either
+    a text file, one position per line: the moves played from the start (columns 1-7, an empty line is the start position)
+      or the board as 42 characters 0/1/2 row by row from the top
+    a .npy file of (N, 6, 7) boards, which is memory mapped
+  The player to move is worked out from the piece counts.
+
+  Transpositions and mirror images are evaluated once. Depth 0 is scored with the vectorized evaluation,
+  deeper searches run on a pool of processes each holding a warm Agent.
+
+  python analyze.py positions.txt --depth 4 --output analysis.jsonl
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from ai.agent import Agent
+from ai.evaluation import WINDOW_INDICES, evaluate_boards
+from ai.bitboard import BitboardState, bit
+from ai.state import state_from_moves
+from ai.windows import ROWS, COLS
+from utils import YELLOW_NUM, RED_NUM, WIN_SCORE, BITBOARD_ENGINE
+
+CELLS = ROWS * COLS
+
+# Positions read and dispatched at a time, and results remembered across chunks (emptied when full)
+CHUNK_SIZE = 10000
+CACHE_SIZE = 1_000_000
+
+BAD_VALUES_ERROR = "Cell values must be 0, 1 or 2"
+FLOATING_ERROR = "Piece above an empty cell"
+COUNTS_ERROR = "Impossible piece counts"
+
+# Value of every cell's bit in the BitboardState layout, so bitmasks of whole stacks of boards are one dot product
+BIT_VALUES = np.array([[bit(i, j) for j in range(COLS)] for i in range(ROWS)], dtype=np.int64)
+
+def parse_line(line):
+    line = line.strip()
+    if len(line) == CELLS and set(line) <= set("012"):
+        return np.array([int(cell) for cell in line], dtype=np.int8).reshape(ROWS, COLS)
+    return state_from_moves(line, BITBOARD_ENGINE).board
+
+# Yields (first index, (N, 6, 7) boards, {index in chunk: error}) for every chunk of the file
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    if path.endswith(".npy"):
+        boards = np.load(path, mmap_mode="r")
+        if boards.shape[1:] != (ROWS, COLS):
+            raise ValueError(f"{path} holds boards of shape {boards.shape[1:]}, not ({ROWS}, {COLS})")
+        for start in range(0, len(boards), chunk_size):
+            chunk = np.asarray(boards[start:start+chunk_size])
+            # Checked before the cast to int8, which would wrap or truncate other values into 0-2
+            bad = ~np.isin(chunk, (0, YELLOW_NUM, RED_NUM)).all(axis=(1, 2))
+            errors = {index: BAD_VALUES_ERROR for index in np.flatnonzero(bad).tolist()}
+            yield start, np.where(bad[:, None, None], 0, chunk).astype(np.int8), errors
+        return
+
+    start = 0
+    boards = []
+    errors = {}
+    with open(path) as file:
+        for line in file:
+            try:
+                boards.append(parse_line(line))
+            except ValueError as error:
+                boards.append(np.zeros((ROWS, COLS), dtype=np.int8))
+                errors[len(boards) - 1] = str(error)
+            if len(boards) == chunk_size:
+                yield start, np.array(boards), errors
+                start += len(boards)
+                boards = []
+                errors = {}
+    if boards:
+        yield start, np.array(boards), errors
+
+# Player to move from the piece counts (yellow moves first), 0 where the counts are impossible
+def get_turns(boards):
+    yellow = np.count_nonzero(boards == YELLOW_NUM, axis=(1, 2))
+    red = np.count_nonzero(boards == RED_NUM, axis=(1, 2))
+    return np.select([yellow == red, yellow == red + 1], [YELLOW_NUM, RED_NUM], 0).astype(np.int8)
+
+# BitboardState.current + BitboardState.mask for every board, the same position key as the opening book
+def get_keys(boards, turns):
+    mask = (boards != 0).reshape(len(boards), CELLS).astype(np.int64) @ BIT_VALUES.reshape(CELLS)
+    current = (boards == turns[:, None, None]).reshape(len(boards), CELLS).astype(np.int64) @ BIT_VALUES.reshape(CELLS)
+    return current + mask
+
+# Whether each board has four in a row for player, players is one per board
+def has_four(flat, players):
+    return (flat[:, WINDOW_INDICES] == players[:, None, None]).all(axis=2).any(axis=1)
+
+# Same result as a depth 0 Agent search, for a stack of boards at once: every legal child is scored by the heuristic,
+# a win or a tie after the move overrides it, and ties between columns go to the lowest one.
+# Returns (moves, evaluations), the move is -1 where the game is already over.
+def static_analysis(boards, turns):
+    n = len(boards)
+    flat = boards.reshape(n, CELLS)
+    heights = np.count_nonzero(boards, axis=1)
+    sign = np.where(turns == YELLOW_NUM, 1, -1)
+
+    # Play every column in every board
+    legal = heights < ROWS
+    cols = np.arange(COLS)
+    cells = (ROWS - 1 - np.minimum(heights, ROWS - 1)) * COLS + cols
+    children = np.repeat(flat[:, None, :], COLS, axis=1)
+    rows = np.arange(n)[:, None]
+    children[rows, cols, cells] = np.where(legal, turns[:, None], children[rows, cols, cells])
+    children = children.reshape(n * COLS, CELLS)
+
+    scores = evaluate_boards(children.reshape(n * COLS, ROWS, COLS)).reshape(n, COLS)
+    full = (heights.sum(axis=1) == CELLS - 1)[:, None] & legal
+    scores = np.where(full, 0, scores)
+    won = has_four(children, np.repeat(turns, COLS)).reshape(n, COLS)
+    scores = np.where(won, sign[:, None] * WIN_SCORE, scores)
+
+    moves = np.argmax(np.where(legal, sign[:, None] * scores, -2 * WIN_SCORE), axis=1)
+    evaluations = scores[np.arange(n), moves]
+
+    # Positions that are already over have no move
+    other = (3 - turns).astype(np.int8)
+    winner = np.select([has_four(flat, turns), has_four(flat, other)], [turns, other], 0)
+    over = (winner != 0) | ~legal.any(axis=1)
+    moves = np.where(over, -1, moves)
+    evaluations = np.select([winner == YELLOW_NUM, winner == RED_NUM, over], [WIN_SCORE, -WIN_SCORE, 0], evaluations)
+    return moves, evaluations
+
+# Agent of the current worker process, created once by _init_worker so its tables stay warm between batches
+_worker_agent = None
+
+def _init_worker(algorithm, depth, solver_threshold, cache):
+    global _worker_agent
+    if depth > 0:
+        _worker_agent = Agent(algorithm=algorithm, depth=depth, engine=BITBOARD_ENGINE, solver_threshold=solver_threshold, cache=cache)
+
+# Runs in a worker, same return value as static_analysis
+def _analyze_batch(boards, turns, depth):
+    if depth == 0:
+        return static_analysis(boards, turns)
+    moves = np.full(len(boards), -1)
+    evaluations = np.zeros(len(boards), dtype=np.int64)
+    for index, (board, turn) in enumerate(zip(boards, turns)):
+        state = BitboardState.from_board(board, int(turn))
+        # With no move history get_winner checks both players, and only the one who moved last can have won
+        winner = state.get_winner()
+        if winner != None:
+            evaluations[index] = WIN_SCORE if winner == YELLOW_NUM else -WIN_SCORE
+        elif not state.is_tie():
+            result = _worker_agent.search(state)
+            moves[index] = result.move
+            evaluations[index] = result.evaluation
+    # The worker is never closed, so its cache writes are committed after every batch
+    if _worker_agent.cache != None:
+        _worker_agent.cache.flush()
+    return moves, evaluations
+
+class Analyzer:
+    # cache is the path of a persistent position cache for the workers' agents, see ai/cache.py
+    def __init__(self, depth=0, algorithm="minimax", workers=None, solver_threshold=None, cache_size=CACHE_SIZE, cache=None):
+        self.depth = depth
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(algorithm, depth, solver_threshold, cache))
+        # Canonical key -> (move in the canonical orientation, evaluation)
+        self.cache = {}
+        self.cache_size = cache_size
+        self.positions = 0
+        self.evaluated = 0 # Positions actually searched, the rest were transpositions, mirror images or cached
+
+    def close(self):
+        self.pool.shutdown()
+
+    # Results for every position of every chunk, in order. One chunk is searched while the next is read.
+    def analyze(self, chunks):
+        pending = deque()
+        for chunk in chunks:
+            pending.append(self.submit(*chunk))
+            if len(pending) > 1:
+                yield from self.collect(pending.popleft())
+        while pending:
+            yield from self.collect(pending.popleft())
+
+    def submit(self, start, boards, errors):
+        turns = get_turns(boards)
+        keys = get_keys(boards, turns)
+        mirrored_boards = boards[:, :, ::-1]
+        mirrored_keys = get_keys(mirrored_boards, turns)
+        mirrored = mirrored_keys < keys
+        canonical = np.where(mirrored, mirrored_keys, keys)
+
+        # Boards that cannot come up in a game are reported instead of searched. Rows go from the top,
+        # so a piece floats when the cell below it is empty.
+        errors = dict(errors)
+        bad_values = ((boards < 0) | (boards > 2)).any(axis=(1, 2))
+        occupied = boards != 0
+        floating = (occupied[:, :-1] & ~occupied[:, 1:]).any(axis=(1, 2))
+        for index in np.flatnonzero(bad_values | floating | (turns == 0)).tolist():
+            errors.setdefault(index, BAD_VALUES_ERROR if bad_values[index] else FLOATING_ERROR if floating[index] else COUNTS_ERROR)
+        valid = np.ones(len(boards), dtype=bool)
+        valid[list(errors)] = False
+
+        # One search per canonical position that is not cached
+        known = {}
+        unique_keys, first = np.unique(canonical[valid], return_index=True)
+        valid_indices = np.flatnonzero(valid)[first]
+        search_keys = []
+        search_indices = []
+        for key, index in zip(unique_keys.tolist(), valid_indices.tolist()):
+            if key in self.cache:
+                known[key] = self.cache[key]
+            else:
+                search_keys.append(key)
+                search_indices.append(index)
+        search_boards = np.where(mirrored[search_indices, None, None], mirrored_boards[search_indices], boards[search_indices])
+        search_turns = turns[search_indices]
+
+        futures = []
+        batches = np.array_split(np.arange(len(search_keys)), self.workers) if search_keys else []
+        for batch in batches:
+            if len(batch):
+                futures.append((batch, self.pool.submit(_analyze_batch, search_boards[batch], search_turns[batch], self.depth)))
+        self.positions += len(boards)
+        self.evaluated += len(search_keys)
+        return start, canonical, mirrored, valid, turns, errors, known, search_keys, futures
+
+    def collect(self, submitted):
+        start, canonical, mirrored, valid, turns, errors, known, search_keys, futures = submitted
+        for batch, future in futures:
+            moves, evaluations = future.result()
+            for index, move, evaluation in zip(batch.tolist(), moves.tolist(), evaluations.tolist()):
+                known[search_keys[index]] = (move, evaluation)
+                if len(self.cache) >= self.cache_size:
+                    self.cache.clear()
+                self.cache[search_keys[index]] = (move, evaluation)
+
+        for index in range(len(canonical)):
+            if not valid[index]:
+                yield {"index": start + index, "error": errors[index]}
+                continue
+            move, evaluation = known[int(canonical[index])]
+            if move >= 0 and mirrored[index]:
+                move = COLS - 1 - move
+            yield {"index": start + index, "column": move + 1 if move >= 0 else None, "evaluation": evaluation}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a file of positions and write one JSON line per position, in input order")
+    parser.add_argument("input", help="text file of positions, or .npy file of (N, 6, 7) boards")
+    parser.add_argument("--depth", type=int, default=0)
+    parser.add_argument("--algorithm", default="minimax")
+    parser.add_argument("--solver-threshold", type=int, default=None, help="solve positions with this many empty cells or fewer exactly")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--cache", default=None, help="persistent position cache to read and add to")
+    parser.add_argument("--output", default="analysis.jsonl")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    analyzer = Analyzer(args.depth, args.algorithm, args.workers, args.solver_threshold, cache=args.cache)
+    try:
+        with open(args.output, "w") as file:
+            for result in analyzer.analyze(read_chunks(args.input, args.chunk_size)):
+                file.write(json.dumps(result) + "\n")
+    finally:
+        analyzer.close()
+    elapsed = time.perf_counter() - start
+    print(f"{analyzer.positions} positions in {elapsed:.1f}s ({analyzer.positions / elapsed:.0f}/s), {analyzer.evaluated} evaluated")
+    print(f"Results written to {args.output}")
@@ -0,0 +1,179 @@
+"""
+  arena.py
+  Headless Agent vs. Agent matches, played in parallel and streamed to a JSON lines file
+
+  Agents are given as specs: an algorithm name optionally followed by Agent arguments, e.g.
+  "random", "minimax:depth=4", "pvs:time_limit=0.2,solver_threshold=none", "mcts:time_limit=0.2"
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ai.agent import Agent, SEARCH_ALGORITHMS
+from game import Connect4Game
+from records import GameRecord, GameRecordWriter
+from utils import PLAYER_MODE, BITBOARD_ENGINE, YELLOW_NUM, RED_NUM
+
+# Types of the Agent arguments that can appear in a spec
+SPEC_ARGUMENTS = {
+    "depth": int,
+    "time_limit": float,
+    "ordering": str,
+    "engine": str,
+    "solver_threshold": int,
+    "book": str,
+    "playouts": int,
+    "cache": str,
+}
+
+def parse_spec(spec):
+    algorithm, _, arguments = spec.partition(":")
+    if algorithm not in ("random", "mcts") and algorithm not in SEARCH_ALGORITHMS:
+        raise ValueError(f"Unknown algorithm {algorithm} in {spec}")
+    kwargs = {"engine": BITBOARD_ENGINE}
+    for argument in filter(None, arguments.split(",")):
+        name, _, value = argument.partition("=")
+        if name not in SPEC_ARGUMENTS:
+            raise ValueError(f"Unknown agent argument {name} in {spec}")
+        kwargs[name] = None if value.lower() == "none" else SPEC_ARGUMENTS[name](value)
+    # Without a budget get_move has no move to return
+    if algorithm in SEARCH_ALGORITHMS and kwargs.get("depth") == None and kwargs.get("time_limit") == None:
+        raise ValueError(f"{spec} needs depth or time_limit")
+    if algorithm == "mcts" and kwargs.get("time_limit") == None and kwargs.get("playouts") == None:
+        raise ValueError(f"{spec} needs time_limit or playouts")
+    return algorithm, kwargs
+
+def make_agent(spec):
+    algorithm, kwargs = parse_spec(spec)
+    return Agent(algorithm=algorithm, **kwargs)
+
+# Random moves from the start that do not end the game
+def random_opening(plies, rng):
+    game = Connect4Game(engine=BITBOARD_ENGINE)
+    moves = []
+    while len(moves) < plies:
+        action = rng.choice(game.state.get_legal_actions())
+        child = game.state.get_new_state(action)
+        if child.get_winner() != None or child.is_tie():
+            continue
+        game.make_move(action)
+        moves.append(action)
+    return moves
+
+# Runs in a worker process, returns the game record
+def play_game(index, yellow_spec, red_spec, opening):
+    agents = {YELLOW_NUM: make_agent(yellow_spec), RED_NUM: make_agent(red_spec)}
+    game = Connect4Game(game_mode=PLAYER_MODE, engine=BITBOARD_ENGINE)
+    for action in opening:
+        game.make_move(action)
+
+    times = []
+    nodes = []
+    while not game.game_over:
+        agent = agents[game.state.turn]
+        start = time.perf_counter()
+        if agent.algorithm in SEARCH_ALGORITHMS:
+            result = agent.search(game.state)
+            action = result.move
+            nodes.append(result.nodes)
+        else:
+            action = agent.get_move(game.state)
+            # Playouts stand in for nodes with MCTS
+            nodes.append(agent.mcts.playouts if agent.mcts != None else 0)
+        times.append(time.perf_counter() - start)
+        game.make_move(action)
+    for agent in agents.values():
+        agent.close()
+
+    return {
+        "game": index,
+        "yellow": yellow_spec,
+        "red": red_spec,
+        "opening": "".join(str(action + 1) for action in opening),
+        "moves": "".join(str(action + 1) for action in game.state.moves),
+        "winner": {YELLOW_NUM: "yellow", RED_NUM: "red", None: None}[game.winner],
+        "times": times,
+        "nodes": nodes,
+    }
+
+# Wilson score interval for a proportion, z = 1.96 gives 95% confidence
+def confidence_interval(score, games, z=1.96):
+    if games == 0:
+        return 0.0, 1.0
+    p = score / games
+    denominator = 1 + z*z / games
+    center = (p + z*z / (2*games)) / denominator
+    margin = z * math.sqrt(p*(1 - p) / games + z*z / (4*games*games)) / denominator
+    return center - margin, center + margin
+
+# Plays games between agent_a and agent_b, each random opening once with each colour.
+# Every finished game is written to output as one JSON line, and also appended to the game record file records if given.
+# Returns the totals from agent_a's point of view.
+def run_match(agent_a, agent_b, games, output, workers=None, opening_plies=2, seed=None, records=None):
+    rng = random.Random(seed)
+    tasks = []
+    for index in range(games):
+        if index % 2 == 0:
+            opening = random_opening(opening_plies, rng)
+        a_is_yellow = index % 2 == 0
+        tasks.append((index, agent_a if a_is_yellow else agent_b, agent_b if a_is_yellow else agent_a, opening))
+
+    totals = {"wins": 0, "draws": 0, "losses": 0, "moves": 0, "time": 0.0}
+    writer = GameRecordWriter(records) if records != None else None
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(output, "w") as file:
+        futures = {pool.submit(play_game, *task): task for task in tasks}
+        for future in as_completed(futures):
+            record = future.result()
+            file.write(json.dumps(record) + "\n")
+            file.flush()
+            if writer != None:
+                writer.write(GameRecord([int(move) - 1 for move in record["moves"]], {"yellow": YELLOW_NUM, "red": RED_NUM}.get(record["winner"]),
+                                        yellow=record["yellow"], red=record["red"], times=record["times"], opening=len(record["opening"])))
+
+            index, yellow_spec, red_spec, opening = futures[future]
+            a_colour = "yellow" if index % 2 == 0 else "red"
+            if record["winner"] == None:
+                totals["draws"] += 1
+            elif record["winner"] == a_colour:
+                totals["wins"] += 1
+            else:
+                totals["losses"] += 1
+            totals["moves"] += len(record["times"])
+            totals["time"] += sum(record["times"])
+    if writer != None:
+        writer.close()
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play Agent vs. Agent matches without a window")
+    parser.add_argument("agent_a")
+    parser.add_argument("agent_b")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--opening-plies", type=int, default=2, help="random moves played before the agents take over")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default="arena_results.jsonl")
+    parser.add_argument("--records", default=None, help="game record file to append the games to, see records.py")
+    args = parser.parse_args()
+
+    for spec in (args.agent_a, args.agent_b):
+        try:
+            parse_spec(spec)
+        except ValueError as error:
+            parser.error(str(error))
+
+    start = time.perf_counter()
+    totals = run_match(args.agent_a, args.agent_b, args.games, args.output, args.workers, args.opening_plies, args.seed, args.records)
+    elapsed = time.perf_counter() - start
+
+    played = totals["wins"] + totals["draws"] + totals["losses"]
+    score = totals["wins"] + totals["draws"] / 2
+    low, high = confidence_interval(score, played)
+    print(f"{args.agent_a} vs. {args.agent_b}: +{totals['wins']} ={totals['draws']} -{totals['losses']} in {elapsed:.1f}s")
+    if played > 0:
+        print(f"Score {score / played:.3f} (95% CI {low:.3f} - {high:.3f})")
+    print(f"Average time per move {totals['time'] / max(totals['moves'], 1) * 1000:.1f}ms")
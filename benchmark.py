@@ -0,0 +1,203 @@
+"""
+  benchmark.py
+  Benchmarks for the state primitives and the search, with regression checks against a saved baseline
+
+  python benchmark.py --output results.json                       run and save
+  python benchmark.py --baseline baseline.json --threshold 0.2    run and fail if anything got more than 20% slower
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import timeit
+from ai.agent import Agent, SEARCH_ALGORITHMS
+from ai.positions import OPENING_POSITIONS, MIDGAME_POSITIONS, ENDGAME_POSITIONS
+from ai.state import state_from_moves
+from utils import ARRAY_ENGINE, BITBOARD_ENGINE, BOT_DEPTH, YELLOW_NUM
+
+POSITIONS = {}
+for category, positions in (("opening", OPENING_POSITIONS), ("midgame", MIDGAME_POSITIONS), ("endgame", ENDGAME_POSITIONS)):
+    for index, moves in enumerate(positions):
+        POSITIONS[f"{category}-{index+1}"] = moves
+
+ENGINES = [ARRAY_ENGINE, BITBOARD_ENGINE]
+
+def play_undo(state, action):
+    state.play(action)
+    state.undo(action)
+
+# Each primitive as a function of (state, action), action is a legal column
+PRIMITIVES = {
+    "is_winning": lambda state, action: state.is_winning(YELLOW_NUM),
+    "get_winner": lambda state, action: state.get_winner(),
+    "is_tie": lambda state, action: state.is_tie(),
+    "is_legal_action": lambda state, action: state.is_legal_action(action),
+    "get_legal_actions": lambda state, action: state.get_legal_actions(),
+    "get_new_state": lambda state, action: state.get_new_state(action),
+    "play_undo": play_undo,
+    "copy": lambda state, action: state.copy(),
+    "evaluate": lambda state, action: state.evaluate(),
+    "count_three_in_row": lambda state, action: state.count_three_in_row(),
+    "count_two_in_row": lambda state, action: state.count_two_in_row(),
+    "count_center": lambda state, action: state.count_center(),
+}
+
+# Average nanoseconds per call over every test position, best of repeat runs
+def run_micro(number, repeat):
+    results = {}
+    for engine in ENGINES:
+        states = [state_from_moves(moves, engine) for moves in POSITIONS.values()]
+        results[engine] = {}
+        for name, primitive in PRIMITIVES.items():
+            total = 0.0
+            for state in states:
+                action = state.get_legal_actions()[0]
+                timer = timeit.Timer(lambda: primitive(state, action))
+                total += min(timer.repeat(repeat=repeat, number=number)) / number
+            results[engine][name] = total / len(states) * 1e9
+    return results
+
+# Fixed-depth Agent.search on every position, best of repeat runs from a fresh agent
+def run_search(algorithm, engine, depth, repeat):
+    results = {}
+    for name, moves in POSITIONS.items():
+        state = state_from_moves(moves, engine)
+        seconds = None
+        for _ in range(repeat):
+            agent = Agent(algorithm=algorithm, depth=depth, engine=engine, solver_threshold=None)
+            start = time.perf_counter()
+            result = agent.search(state)
+            elapsed = time.perf_counter() - start
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+        results[name] = {
+            "depth": depth,
+            "move": result.move,
+            "nodes": result.nodes,
+            "seconds": seconds,
+            "nodes_per_second": result.nodes / seconds if seconds > 0 else 0.0,
+        }
+    return results
+
+# Time for Agent.get_move to reach each depth, searching from a fresh agent every time
+def run_time_to_depth(algorithm, engine, max_depth):
+    results = {}
+    for name, moves in POSITIONS.items():
+        state = state_from_moves(moves, engine)
+        results[name] = []
+        for depth in range(max_depth + 1):
+            agent = Agent(algorithm=algorithm, depth=depth, engine=engine, solver_threshold=None)
+            start = time.perf_counter()
+            agent.get_move(state)
+            results[name].append(time.perf_counter() - start)
+    return results
+
+# Sums over all positions. Single positions are too noisy to check for regressions, these totals are what compare() uses.
+def get_totals(results):
+    totals = {"search": {}, "time_to_depth": {}}
+    for key, positions in results["search"].items():
+        nodes = sum(position["nodes"] for position in positions.values())
+        seconds = sum(position["seconds"] for position in positions.values())
+        totals["search"][key] = {"nodes": nodes, "seconds": seconds, "nodes_per_second": nodes / seconds if seconds > 0 else 0.0}
+    for key, positions in results["time_to_depth"].items():
+        totals["time_to_depth"][key] = [sum(times) for times in zip(*positions.values())]
+    return totals
+
+# Seconds from spawning a fresh engine.py to its answers, best of repeat: "ready" to isready, "first_move" to a depth 1 go.
+# "interpreter" is how long Python alone takes to start and exit, for comparison.
+def run_startup(repeat):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    interpreter = min(timeit.repeat(lambda: subprocess.run([sys.executable, "-c", "pass"]), repeat=repeat, number=1))
+    ready = first_move = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine = subprocess.Popen([sys.executable, "engine.py"], cwd=directory, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        engine.stdin.write("isready\n")
+        engine.stdin.flush()
+        while engine.stdout.readline().strip() != "readyok":
+            pass
+        ready = min(ready, time.perf_counter() - start)
+        engine.stdin.write("go depth 1\n")
+        engine.stdin.flush()
+        while not engine.stdout.readline().startswith("bestmove"):
+            pass
+        first_move = min(first_move, time.perf_counter() - start)
+        engine.communicate("quit\n")
+    return {"interpreter": interpreter, "ready": ready, "first_move": first_move}
+
+def run_benchmarks(depth, quick=False):
+    number, repeat = (100, 3) if quick else (1000, 5)
+    search_repeat = 1 if quick else 3
+    results = {"micro": run_micro(number, repeat), "startup": run_startup(repeat), "search": {}, "time_to_depth": {}}
+    for algorithm in SEARCH_ALGORITHMS:
+        results["search"][f"{algorithm}-{BITBOARD_ENGINE}"] = run_search(algorithm, BITBOARD_ENGINE, depth, search_repeat)
+        results["time_to_depth"][f"{algorithm}-{BITBOARD_ENGINE}"] = run_time_to_depth(algorithm, BITBOARD_ENGINE, depth)
+    results["search"][f"minimax-{ARRAY_ENGINE}"] = run_search("minimax", ARRAY_ENGINE, min(depth, BOT_DEPTH), search_repeat)
+    results["totals"] = get_totals(results)
+    return results
+
+# Flatten nested results into {"a.b.c": value}
+def flatten(results, prefix=""):
+    flat = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            flat.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(results, list):
+        for index, value in enumerate(results):
+            flat.update(flatten(value, f"{prefix}{index}."))
+    else:
+        flat[prefix[:-1]] = results
+    return flat
+
+# Returns a list of (metric, baseline, current, change) for the micro-benchmarks, start up times and totals that got worse by more than threshold
+def compare(results, baseline, threshold):
+    current = flatten({key: results.get(key, {}) for key in ("micro", "startup", "totals")})
+    regressions = []
+    for metric, old in flatten({key: baseline.get(key, {}) for key in ("micro", "startup", "totals")}).items():
+        new = current.get(metric)
+        if new is None or old <= 0:
+            continue
+        if metric.endswith(".nodes_per_second"):
+            change = old / new - 1 if new > 0 else float("inf") # Higher is better
+        elif metric.endswith(".nodes"):
+            continue # Node counts only change with the algorithm, not the speed
+        else:
+            change = new / old - 1 # Lower is better
+        if change > threshold:
+            regressions.append((metric, old, new, change))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the state primitives and the search")
+    parser.add_argument("--depth", type=int, default=BOT_DEPTH + 2)
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions for the micro-benchmarks")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before a metric counts as a regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.depth, args.quick)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    for engine, primitives in results["micro"].items():
+        print(f"{engine}: " + ", ".join(f"{name} {ns:.0f}ns" for name, ns in primitives.items()))
+    startup = results["startup"]
+    print(f"engine.py start up: ready {startup['ready'] * 1000:.0f}ms, first move {startup['first_move'] * 1000:.0f}ms (python alone {startup['interpreter'] * 1000:.0f}ms)")
+    for key, total in results["totals"]["search"].items():
+        print(f"{key}: {total['nodes']} nodes in {total['seconds']:.2f}s, {total['nodes_per_second']:.0f} nodes/s")
+    for key, times in results["totals"]["time_to_depth"].items():
+        print(f"{key} time to depth: " + ", ".join(f"{depth}: {seconds:.3f}s" for depth, seconds in enumerate(times)))
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for metric, old, new, change in regressions:
+            print(f"REGRESSION {metric}: {old:.6g} -> {new:.6g} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions over {args.threshold:.0%} against {args.baseline}")
@@ -3,12 +3,16 @@
   Main game executable
 """
 
+import os
+import traceback
 import pygame
 from pygame.locals import *
 from gui import *
 from utils import *
-from game import *
-from ai.agent import *
+from game import Connect4Game
+from ai.agent import Agent
+from ai.ponder import Ponderer
+from ai.worker import SearchWorker
 
 # Main menu screen
 def main(screen):
@@ -53,13 +57,44 @@ def main(screen):
         
         pygame.display.update()
 
+# Change a text element only if its text or color changed, adding the areas it covered and now covers to dirty
+def update_text(screen, text, message, color, center, dirty):
+    if message == text.text and color == text.color:
+        return
+    screen.fill(BLACK, text.rect)
+    dirty.append(text.rect)
+    text.set_text(message, color)
+    text.position_center(*center)
+    screen.blit(text.obj, text.rect)
+    dirty.append(text.rect)
+
+# Abandon any search the bot is running in the background and close its files
+def stop_bot(bot, ai_worker, ponderer):
+    if ai_worker != None:
+        ai_worker.cancel()
+    if ponderer != None:
+        ponderer.stop()
+    if bot != None:
+        bot.close()
+
 # Game screen
 def play(screen, mode):
     # Game object
-    game_obj = Connect4Game(game_mode=mode)
+    game_obj = Connect4Game(game_mode=mode, engine=BOT_ENGINE)
     
+    bot = None
+    ponderer = None
+    ai_worker = None
+    ai_error = None # Set when the AI's search fails, the AI stops playing and the error is shown instead
     if mode == AI_MODE:
-        bot = Agent(algorithm="minimax", depth=BOT_DEPTH)
+        bot = Agent(algorithm="minimax", depth=BOT_DEPTH, engine=BOT_ENGINE, book=BOOK_PATH if os.path.exists(BOOK_PATH) else None, cache=CACHE_PATH if BOT_CACHE else None)
+        # The bot searches on a background thread so the window keeps responding
+        ai_worker = SearchWorker(bot)
+        # Search the replies to the player's possible moves while they think
+        if BOT_PONDER:
+            ponderer = Ponderer(bot)
+            if game_obj.state.turn != game_obj.ai_color:
+                ponderer.start(game_obj.state)
 
     screen.fill(BLACK)
 
@@ -69,6 +104,9 @@ def play(screen, mode):
     # Game over text element 
     game_over_text = Text("", "Courier New", 48, WHITE)
 
+    # Search progress text element, shown while the AI is thinking
+    progress_text = Text("", "Courier New", 20, WHITE)
+
     # Draw board
     board_width = CIRCLE_RADIUS*2*7 + BOARD_PADDING*8
     board_height = CIRCLE_RADIUS*2*6 + BOARD_PADDING*7
@@ -85,37 +123,56 @@ def play(screen, mode):
         for j in range(7):
             circles[i].append(Circle(grid_x + BOARD_PADDING + (BOARD_PADDING+CIRCLE_RADIUS*2)*j, grid_y + BOARD_PADDING + (BOARD_PADDING+CIRCLE_RADIUS*2)*i, CIRCLE_RADIUS))
 
+    # Only what changes is redrawn: drawn holds the color each circle was last drawn with,
+    # and the areas drawn over in a frame are collected in dirty and passed to display.update
+    drawn = [[None]*7 for _ in range(7)]
+    game_over_drawn = False
+    clock = pygame.time.Clock()
+    pygame.display.update()
+
     # Main game loop
     running = True
     while running:
+        dirty = []
+        ai_moved = False
+        ai_turn = game_obj.game_mode == AI_MODE and game_obj.state.turn == game_obj.ai_color
+
         # Set text according to turn
-        screen.fill(BLACK, turn_text.rect)
         if game_obj.game_mode == PLAYER_MODE:
-            turn_text.set_text(f"Player {game_obj.state.turn}'s Turn", RED if game_obj.state.turn == RED_NUM else YELLOW)
+            update_text(screen, turn_text, f"Player {game_obj.state.turn}'s Turn", RED if game_obj.state.turn == RED_NUM else YELLOW, (SCREEN_WIDTH / 2, 32), dirty)
         else:
             if game_obj.state.turn == RED_NUM:
-                turn_text.set_text("AI's Turn" if game_obj.ai_color == RED_NUM else "Player 1's Turn", RED)
+                update_text(screen, turn_text, "AI's Turn" if game_obj.ai_color == RED_NUM else "Player 1's Turn", RED, (SCREEN_WIDTH / 2, 32), dirty)
             else:
-                turn_text.set_text("AI's Turn" if game_obj.ai_color == YELLOW_NUM else "Player 1's Turn", YELLOW)
-        turn_text.position_center(SCREEN_WIDTH / 2, 32)
-        screen.blit(turn_text.obj, turn_text.rect)
+                update_text(screen, turn_text, "AI's Turn" if game_obj.ai_color == YELLOW_NUM else "Player 1's Turn", YELLOW, (SCREEN_WIDTH / 2, 32), dirty)
+
+        # The top row shows the current player's color over the column the mouse is in, unless it is the AI's turn or the game is over
+        hover_col = None
+        if not game_obj.game_over and not ai_turn:
+            for j in range(len(circles[0])):
+                if circles[0][j].is_hovering():
+                    hover_col = j
 
-        # Draw grid of circles
+        # Draw the circles that changed since the last frame
+        board = game_obj.state.board
         for i in range(len(circles[0])):
             for j in range(len(circles[0])):
                 if i == 0:
-                    circles[i][j].draw(screen, BLACK)
+                    color = (RED if game_obj.state.turn == RED_NUM else YELLOW) if j == hover_col else BLACK
+                # Draw according to board array
+                elif board[i-1][j] == 0:
+                    color = DARK_BLUE
+                elif board[i-1][j] == RED_NUM:
+                    color = RED
                 else:
-                    # Draw according to board array
-                    if game_obj.state.board[i-1][j] == 0:
-                        circles[i][j].draw(screen, DARK_BLUE)
-                    elif game_obj.state.board[i-1][j] == RED_NUM:
-                        circles[i][j].draw(screen, RED)
-                    else:
-                        circles[i][j].draw(screen, YELLOW)
+                    color = YELLOW
+                if drawn[i][j] != color:
+                    circles[i][j].draw(screen, color)
+                    drawn[i][j] = color
+                    dirty.append(circles[i][j].rect)
 
-        # Draw game over text if game over
-        if game_obj.game_over:
+        # Draw game over text once the game is over
+        if game_obj.game_over and not game_over_drawn:
             if game_obj.winner: # Someone won
                 if game_obj.game_mode == PLAYER_MODE:
                     game_over_text.set_text(f"Player {game_obj.winner} Wins!", RED if game_obj.state.turn == RED_NUM else YELLOW)
@@ -129,34 +186,65 @@ def play(screen, mode):
             game_over_text.position_center(SCREEN_WIDTH/2, SCREEN_HEIGHT/2)
             screen.fill(BLACK, game_over_text.rect)
             screen.blit(game_over_text.obj, game_over_text.rect)
-        else: # Game not over
-            if not (game_obj.game_mode == AI_MODE and game_obj.state.turn == game_obj.ai_color):
-                # For all the circles in the top row, check if mouse is hovering over
-                for i in range(len(circles[0])):
-                    if circles[0][i].is_hovering():
-                        circles[0][i].draw(screen, RED if game_obj.state.turn == RED_NUM else YELLOW)
-                    else:
-                        circles[0][i].draw(screen, BLACK)
-            else: # AI mode, AI's turn, don't do mouse hover check
-                pygame.display.update() # Make sure the previous move is made visually before the AI starts thinking
+            dirty.append(game_over_text.rect)
+            game_over_drawn = True
+        elif not game_obj.game_over and ai_turn and ai_error == None:
+            ai_move = None
+            if not ai_worker.is_busy():
+                # Play the pondered reply straight away if there is one, otherwise start searching
+                if ponderer != None and game_obj.state.moves:
+                    ai_move = ponderer.get_move(game_obj.state.moves[-1])
+                if ai_move == None:
+                    ai_worker.start(game_obj.state)
+            elif ai_worker.done():
+                ai_move = ai_worker.take_move()
+                ai_error = ai_worker.error
+                if ai_error != None:
+                    traceback.print_exception(ai_error)
 
-                ai_move = bot.get_move(game_obj.state)
+            if ai_error != None:
+                update_text(screen, progress_text, f"AI error: {ai_error}", RED, (SCREEN_WIDTH / 2, SCREEN_HEIGHT - 18), dirty)
+            elif ai_move == None: # Still thinking
+                depth, nodes = ai_worker.progress()
+                update_text(screen, progress_text, f"Thinking... depth {depth}, {nodes} nodes", WHITE, (SCREEN_WIDTH / 2, SCREEN_HEIGHT - 18), dirty)
+            else:
+                update_text(screen, progress_text, "", WHITE, (SCREEN_WIDTH / 2, SCREEN_HEIGHT - 18), dirty)
+                pygame.display.update(dirty)
+                dirty = []
 
                 # For the visuals, hover over the selected move before playing it
                 for i in range(ai_move + 1):
                     circles[0][i].draw(screen, RED if game_obj.ai_color == RED_NUM else YELLOW)
-                    pygame.display.update()
+                    pygame.display.update(circles[0][i].rect)
                     pygame.time.wait(100)
                     circles[0][i].draw(screen, BLACK)
+                    dirty.append(circles[0][i].rect)
                 pygame.time.wait(500)
 
                 game_obj.make_move(ai_move)
+                ai_moved = True
+                if ponderer != None and not game_obj.game_over:
+                    ponderer.start(game_obj.state)
 
-        for event in pygame.event.get():
+        if dirty:
+            pygame.display.update(dirty)
+
+        # Draw the AI's move straight away and redraw often while it is thinking to keep the progress current,
+        # otherwise sleep until something happens
+        if ai_moved or (ai_worker != None and ai_worker.is_busy()):
+            clock.tick(THINKING_FPS)
+            events = pygame.event.get()
+        else:
+            clock.tick(FPS)
+            events = [pygame.event.wait(IDLE_TIMEOUT)] + pygame.event.get()
+
+        for event in events:
             if event.type == pygame.QUIT:
+                stop_bot(bot, ai_worker, ponderer)
                 pygame.quit()
             elif event.type == pygame.KEYDOWN:
                 if event.key == K_ESCAPE:
+                    stop_bot(bot, ai_worker, ponderer)
                     running = False
                     screen.fill(BLACK)
                     return
@@ -167,8 +255,8 @@ def play(screen, mode):
                             if circles[0][i].is_hovering():
                                 if game_obj.state.is_legal_action(i):
                                     game_obj.make_move(i)
-
-        pygame.display.update()
+                                    if ponderer != None and game_obj.game_over:
+                                        ponderer.stop()
 
 # Run the game
 pygame.init()
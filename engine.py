@@ -0,0 +1,159 @@
+"""
+  engine.py
+  Headless engine driven by text commands, one per line on stdin, with every answer written to stdout straight away
+
+  Commands (columns are 1-7, evaluations are from yellow's point of view like everywhere else):
+    position [moves]          set the position from the moves played since the start, e.g. "position 4453"
+    go [depth N] [time S]     search it, one "info depth D nodes N time T" line per finished depth, then
+                              "bestmove C eval E depth D nodes N time T source book|cache|solver|search"
+    eval                      heuristic score of the position: "eval E"
+    solve                     exact value with perfect play: "solve result win|loss|draw score S bestmove C nodes N"
+                              (result is for the player to move, score as in ai/solver.py)
+    new                       forget everything learned in earlier searches
+    isready                   answered with "readyok" once every earlier command is done
+    quit
+  Commands run one at a time in order. Mistakes are answered with "error <message>" and the engine carries on.
+
+  Only the search itself is imported at start up and pygame never is, so the engine is quick to spawn from scripts
+  and process pools. python benchmark.py measures how long it takes to answer.
+
+  echo -e "position 4453\\ngo time 0.5\\nquit" | python engine.py
+"""
+
+import argparse
+import sys
+from ai.agent import Agent, SEARCH_ALGORITHMS
+from ai.solver import Solver
+from ai.state import new_state
+from utils import BOT_DEPTH, BITBOARD_ENGINE, SOLVER_EMPTY_CELLS, WIN_SCORE, YELLOW_NUM
+
+class Engine:
+    def __init__(self, algorithm="pvs", solver_threshold=SOLVER_EMPTY_CELLS, book=None, cache=None, output=sys.stdout):
+        self.algorithm = algorithm
+        self.solver_threshold = solver_threshold
+        self.book = book
+        self.cache = cache
+        self.output = output
+        self.state = new_state(BITBOARD_ENGINE)
+        # Created on first use and kept, so later searches reuse the tables of earlier ones
+        self.agent = None
+        self.solver = None
+
+    def close(self):
+        if self.agent != None:
+            self.agent.close()
+
+    def send(self, line):
+        self.output.write(line + "\n")
+        self.output.flush()
+
+    # Runs one command line, returns False on quit
+    def handle(self, line):
+        words = line.split()
+        if not words:
+            return True
+        command, arguments = words[0], words[1:]
+        try:
+            if command == "quit":
+                return False
+            elif command == "position":
+                self.set_position("".join(arguments))
+            elif command == "go":
+                self.go(arguments)
+            elif command == "eval":
+                self.send(f"eval {self.evaluate()}")
+            elif command == "solve":
+                self.solve()
+            elif command == "new":
+                self.close()
+                self.agent = None
+                self.solver = None
+            elif command == "isready":
+                self.send("readyok")
+            else:
+                raise ValueError(f"Unknown command {command}")
+        except ValueError as error:
+            self.send(f"error {error}")
+        return True
+
+    def set_position(self, moves):
+        state = new_state(BITBOARD_ENGINE)
+        for move in moves:
+            if self.is_over(state):
+                raise ValueError(f"Move {move} after the end of the game in {moves}")
+            if move not in "1234567" or not state.is_legal_action(int(move) - 1):
+                raise ValueError(f"Illegal move {move} in {moves}")
+            state.play(int(move) - 1)
+        self.state = state
+
+    def is_over(self, state):
+        return state.get_winner() != None or state.is_tie()
+
+    def go(self, arguments):
+        if len(arguments) % 2 != 0:
+            raise ValueError("go takes pairs of depth N and time S")
+        depth = time_limit = None
+        for name, value in zip(arguments[::2], arguments[1::2]):
+            if name not in ("depth", "time"):
+                raise ValueError(f"Unknown go option {name}")
+            try:
+                if name == "depth":
+                    depth = int(value)
+                else:
+                    time_limit = float(value)
+            except ValueError:
+                raise ValueError(f"Bad {name} {value}")
+        if depth != None and depth < 1:
+            raise ValueError(f"Depth must be at least 1, not {depth}")
+        if time_limit != None and time_limit <= 0:
+            raise ValueError(f"Time must be positive, not {time_limit}")
+        if depth == None and time_limit == None:
+            depth = BOT_DEPTH
+        if self.is_over(self.state):
+            raise ValueError("The game is over")
+
+        if self.agent == None:
+            self.agent = Agent(algorithm=self.algorithm, engine=BITBOARD_ENGINE, solver_threshold=self.solver_threshold, book=self.book, cache=self.cache)
+        self.agent.depth = depth
+        self.agent.time_limit = time_limit
+        result = self.agent.search(self.state, stats=True)
+        stats = result.stats
+        for iteration_depth, nodes, seconds in stats.iterations:
+            self.send(f"info depth {iteration_depth} nodes {nodes} time {seconds:.3f}")
+        self.send(f"bestmove {result.move + 1} eval {result.evaluation} depth {result.depth} nodes {result.nodes} time {stats.seconds:.3f} source {stats.source}")
+
+    # Depth 0 score, or the final result when the game is over
+    def evaluate(self):
+        winner = self.state.get_winner()
+        if winner != None:
+            return WIN_SCORE if winner == YELLOW_NUM else -WIN_SCORE
+        return 0 if self.state.is_tie() else self.state.evaluate()
+
+    def solve(self):
+        if self.is_over(self.state):
+            raise ValueError("The game is over")
+        if self.solver == None:
+            self.solver = Solver()
+        self.solver.nodes = 0
+        action, score = self.solver.best_action(self.state)
+        result = "win" if score > 0 else "loss" if score < 0 else "draw"
+        self.send(f"solve result {result} score {score} bestmove {action + 1} nodes {self.solver.nodes}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Connect 4 engine reading commands on stdin and writing results to stdout")
+    parser.add_argument("--algorithm", default="pvs", choices=SEARCH_ALGORITHMS)
+    parser.add_argument("--solver-threshold", type=lambda value: None if value.lower() == "none" else int(value), default=SOLVER_EMPTY_CELLS,
+                        help="solve positions with this many empty cells or fewer exactly, none to always search")
+    parser.add_argument("--book", default=None, help="opening book to play from, see ai/book.py")
+    parser.add_argument("--cache", default=None, help="persistent position cache, see ai/cache.py")
+    args = parser.parse_args()
+
+    engine = Engine(args.algorithm, args.solver_threshold, args.book, args.cache)
+    try:
+        for line in sys.stdin:
+            if not engine.handle(line):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
@@ -3,14 +3,13 @@
     Contains the Connect4Game class which keeps track of game infomration
 """
 
-import numpy as np
 import random
-from ai.state import *
-from utils import PLAYER_MODE, AI_MODE
+from ai.state import new_state
+from utils import PLAYER_MODE, AI_MODE, ARRAY_ENGINE, YELLOW_NUM, RED_NUM
 
 class Connect4Game():
-    def __init__(self, game_mode=PLAYER_MODE):
-        self.state = GameState(np.zeros((6, 7)), YELLOW_NUM)
+    def __init__(self, game_mode=PLAYER_MODE, engine=ARRAY_ENGINE):
+        self.state = new_state(engine)
         self.game_mode = game_mode
         self.ai_color = None
         self.winner = None
@@ -19,16 +18,14 @@ class Connect4Game():
             self.ai_color = random.choice([YELLOW_NUM, RED_NUM])
 
     def make_move(self, col):
-        for i in range(self.state.board.shape[0]-1, -1, -1):
-            if self.state.board[i][col] == 0:
-                self.state.board[i][col] = self.state.turn
-                break
-        if self.state.is_winning(self.state.turn):
-            self.winner = self.state.turn
+        player = self.state.turn
+        self.state = self.state.get_new_state(col)
+        if self.state.get_winner() == player:
+            self.winner = player
             self.game_over = True
-            return
         elif self.state.is_tie():
             self.game_over = True
-            return
 
-        self.state.change_turn()
\ No newline at end of file
+        # Leave the turn on the player who made the final move
+        if self.game_over:
+            self.state.change_turn()
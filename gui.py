@@ -5,14 +5,27 @@ Contains classes for graphical elements
 
 import pygame
 
+# Rendered surfaces kept per Text, cleared when it gets this big
+TEXT_CACHE_SIZE = 64
+
 class Text:
     def __init__(self, text, font_name, font_size, font_color):
         self.font = pygame.font.SysFont(font_name, font_size)
         self.text = text
         self.font_color = font_color
-        self.obj = self.font.render(self.text, True, self.font_color)
+        self.color = font_color
+        self.cache = {} # (text, color) -> surface, so switching between a few texts does not render them again
+        self.obj = self.render(text, font_color)
         self.rect = self.obj.get_rect()
 
+    def render(self, text, color):
+        key = (text, color)
+        if key not in self.cache:
+            if len(self.cache) >= TEXT_CACHE_SIZE:
+                self.cache.clear()
+            self.cache[key] = self.font.render(text, True, color)
+        return self.cache[key]
+
     # Place the center of the text at (x, y)
     def position_center(self, x, y):
         self.rect.center = (x, y)
@@ -22,7 +35,9 @@ class Text:
         self.rect.topleft = (x, y)
 
     def set_text(self, text, color=None):
-        self.obj = self.font.render(text, True, self.font_color if color == None else color)
+        self.text = text
+        self.color = self.font_color if color == None else color
+        self.obj = self.render(self.text, self.color)
         self.rect = self.obj.get_rect()
 
 class Button:
@@ -0,0 +1,112 @@
+"""
+  loadgen.py
+  Load generator for server.py: many connections each playing random moves against the AI, game after game
+
+  python loadgen.py --connections 16 --duration 30 --time-limit 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from server import percentiles
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, **request):
+        self.writer.write((json.dumps(request) + "\n").encode())
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+# Play games until the deadline, each with a random AI color and random legal moves for the other side.
+# Adds the latency of every request that got an AI move to latencies, returns (games, moves, errors, retries).
+# retries counts the AI replies that had to be asked for again because the server was busy.
+async def play_games(host, port, deadline, time_limit, latencies, rng):
+    reader, writer = await asyncio.open_connection(host, port)
+    client = Client(reader, writer)
+    games = moves = errors = retries = 0
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            state = await client.request(cmd="new", ai_color=rng.choice(["yellow", "red"]), time_limit=time_limit)
+            while True:
+                if state["ok"] and "ai_column" in state:
+                    latencies.append(time.perf_counter() - start)
+                    moves += 1
+                if not state["ok"] or state["game_over"] or time.perf_counter() >= deadline:
+                    break
+                start = time.perf_counter()
+                if "ai_error" in state:
+                    # The server kept the game as it was, ask for the AI's reply again
+                    retries += 1
+                    response = await client.request(cmd="ai", time_limit=time_limit)
+                    if not response["ok"] and "busy" in response["error"]:
+                        continue
+                else:
+                    heights = [state["moves"].count(str(column)) for column in range(1, 8)]
+                    column = rng.choice([column for column in range(1, 8) if heights[column - 1] < 6])
+                    response = await client.request(cmd="move", column=column, time_limit=time_limit)
+                    if response["ok"]:
+                        moves += 1
+                state = response
+            if not state["ok"]:
+                errors += 1
+            elif state["game_over"]:
+                games += 1
+    finally:
+        await client.close()
+    return games, moves, errors, retries
+
+async def run(host, port, connections, duration, time_limit, seed=None):
+    rng = random.Random(seed)
+    latencies = []
+    start = time.perf_counter()
+    deadline = start + duration
+    results = await asyncio.gather(*[play_games(host, port, deadline, time_limit, latencies, random.Random(rng.random())) for _ in range(connections)])
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    client = Client(reader, writer)
+    server_stats = await client.request(cmd="stats")
+    await client.close()
+
+    games = sum(result[0] for result in results)
+    moves = sum(result[1] for result in results)
+    return {
+        "connections": connections,
+        "seconds": elapsed,
+        "games": games,
+        "moves": moves,
+        "errors": sum(result[2] for result in results),
+        "retries": sum(result[3] for result in results),
+        "games_per_second": games / elapsed,
+        "moves_per_second": moves / elapsed,
+        "latency_ms": {f"p{point}": None if value == None else value * 1000 for point, value in percentiles(latencies, (50, 90, 99, 100)).items()},
+        "server": server_stats,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many concurrent games against server.py and report throughput and latency")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4444)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to keep starting moves for")
+    parser.add_argument("--time-limit", type=float, default=0.05, help="AI budget per move asked for in each request")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.host, args.port, args.connections, args.duration, args.time_limit, args.seed))
+    latency = report["latency_ms"]
+    print(f"{report['connections']} connections, {report['seconds']:.1f}s: {report['games']} games, {report['moves']} moves, {report['errors']} errors, {report['retries']} busy retries")
+    print(f"{report['games_per_second']:.2f} games/s, {report['moves_per_second']:.1f} moves/s")
+    if latency["p50"] != None:
+        print(f"AI reply latency: p50 {latency['p50']:.1f}ms, p90 {latency['p90']:.1f}ms, p99 {latency['p99']:.1f}ms, max {latency['p100']:.1f}ms")
+    print(f"Server: {json.dumps(report['server'])}")
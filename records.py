@@ -0,0 +1,303 @@
+"""
+  records.py
+  Compact binary game records: games are appended to a file one at a time and read back as a stream
+
+  File layout (little endian):
+    header:  magic b"C4GR", version (uint16)
+    games:   size of the rest of the game (uint16), then
+               result (uint8: 0 unfinished, 1 yellow won, 2 red won, 3 draw), flags (uint8), move count (uint8),
+               opening plies (uint8), yellow and red agent spec lengths (uint8 each), the two specs (UTF-8),
+               seconds per move after the opening (float16 each, only if flags has HAS_TIMES),
+               moves packed 3 bits each, first move in the lowest bits
+  A game of 30 moves with timings takes about 80 bytes. The sidecar file <path>.idx holds the offset of every game
+  (uint64 each) so games can be read by index. It is only a shortcut: the size prefixes are always enough to walk
+  the file, and a missing or stale index is caught up from them.
+
+  python records.py games.c4r --game 12
+"""
+
+import argparse
+import os
+import struct
+import sys
+from array import array
+from ai.state import new_state
+from game import Connect4Game
+from utils import PLAYER_MODE, ARRAY_ENGINE, YELLOW_NUM, RED_NUM
+
+MAGIC = b"C4GR"
+VERSION = 1
+HEADER = struct.Struct("<4sH")
+SIZE = struct.Struct("<H")
+FIXED = struct.Struct("<BBBBBB")
+OFFSET = struct.Struct("<Q")
+
+RESULT_UNFINISHED = 0
+RESULT_DRAW = 3
+RESULT_NAMES = {RESULT_UNFINISHED: "unfinished", YELLOW_NUM: "yellow", RED_NUM: "red", RESULT_DRAW: "draw"}
+
+# Flags
+HAS_TIMES = 1
+
+MOVE_BITS = 3
+MAX_SPEC_LENGTH = 255
+MAX_HALF_FLOAT = 65504.0
+
+def index_path(path):
+    return path + ".idx"
+
+# Moves (columns 0-6) as bytes, MOVE_BITS each
+def pack_moves(moves):
+    value = 0
+    for i, action in enumerate(moves):
+        value |= action << (MOVE_BITS*i)
+    return value.to_bytes((MOVE_BITS*len(moves) + 7) // 8, "little")
+
+def unpack_moves(data, count):
+    value = int.from_bytes(data, "little")
+    moves = [(value >> (MOVE_BITS*i)) & 7 for i in range(count)]
+    if 7 in moves:
+        raise ValueError("Corrupt game record: move out of range")
+    return moves
+
+class GameRecord:
+    # moves are columns 0-6 from the starting position, the first opening of them were not chosen by the agents.
+    # yellow and red describe the players, e.g. arena agent specs. times, if known, are the seconds taken by each
+    # move after the opening.
+    def __init__(self, moves, winner=None, finished=True, yellow="", red="", times=None, opening=0):
+        self.moves = moves
+        self.winner = winner
+        self.finished = finished
+        self.yellow = yellow
+        self.red = red
+        self.times = times
+        self.opening = opening
+
+    @classmethod
+    def from_game(cls, game, yellow="", red="", times=None, opening=0):
+        return cls(list(game.state.moves), game.winner, game.game_over, yellow, red, times, opening)
+
+    @property
+    def result(self):
+        if not self.finished:
+            return RESULT_UNFINISHED
+        return RESULT_DRAW if self.winner == None else self.winner
+
+    def encode(self):
+        yellow = (self.yellow or "").encode()
+        red = (self.red or "").encode()
+        if len(yellow) > MAX_SPEC_LENGTH or len(red) > MAX_SPEC_LENGTH:
+            raise ValueError(f"Agent specs are limited to {MAX_SPEC_LENGTH} bytes")
+        flags = HAS_TIMES if self.times != None else 0
+        parts = [FIXED.pack(self.result, flags, len(self.moves), self.opening, len(yellow), len(red)), yellow, red]
+        if self.times != None:
+            if len(self.times) != len(self.moves) - self.opening:
+                raise ValueError("There must be one time per move after the opening")
+            parts.append(struct.pack(f"<{len(self.times)}e", *(min(seconds, MAX_HALF_FLOAT) for seconds in self.times)))
+        parts.append(pack_moves(self.moves))
+        return b"".join(parts)
+
+    @classmethod
+    def decode(cls, data):
+        if len(data) < FIXED.size:
+            raise ValueError("Corrupt game record")
+        result, flags, count, opening, yellow_length, red_length = FIXED.unpack_from(data, 0)
+        timed = count - opening if flags & HAS_TIMES else 0
+        size = FIXED.size + yellow_length + red_length + 2*timed + (MOVE_BITS*count + 7) // 8
+        if len(data) != size or result not in RESULT_NAMES or opening > count:
+            raise ValueError("Corrupt game record")
+        offset = FIXED.size
+        yellow = data[offset:offset+yellow_length].decode()
+        offset += yellow_length
+        red = data[offset:offset+red_length].decode()
+        offset += red_length
+        times = None
+        if flags & HAS_TIMES:
+            times = list(struct.unpack_from(f"<{timed}e", data, offset))
+            offset += 2*timed
+        moves = unpack_moves(data[offset:], count)
+        winner = result if result in (YELLOW_NUM, RED_NUM) else None
+        return cls(moves, winner, result != RESULT_UNFINISHED, yellow, red, times, opening)
+
+    # Every position of the game, from the starting one to the last, each a new state
+    def positions(self, engine=ARRAY_ENGINE):
+        state = new_state(engine)
+        yield state
+        for action in self.moves:
+            if not state.is_legal_action(action):
+                raise ValueError(f"Illegal move {action + 1} in game record")
+            state = state.get_new_state(action)
+            yield state
+
+    # Replay the moves into a Connect4Game
+    def to_game(self, engine=ARRAY_ENGINE):
+        game = Connect4Game(game_mode=PLAYER_MODE, engine=engine)
+        for action in self.moves:
+            if game.game_over or not game.state.is_legal_action(action):
+                raise ValueError(f"Illegal move {action + 1} in game record")
+            game.make_move(action)
+        return game
+
+    def to_dict(self):
+        return {
+            "moves": "".join(str(action + 1) for action in self.moves),
+            "result": RESULT_NAMES[self.result],
+            "yellow": self.yellow,
+            "red": self.red,
+            "opening": self.opening,
+            "times": self.times,
+        }
+
+# Closes the file when it is not a record file
+def check_header(file, path):
+    file.seek(0)
+    header = file.read(HEADER.size)
+    if len(header) < HEADER.size or HEADER.unpack(header) != (MAGIC, VERSION):
+        file.close()
+        raise ValueError(f"{path} is not a game record file this version can read")
+
+# Offsets of all complete games in an open record file and the end of the last one.
+# The index is trusted up to its last entry, everything after that is found from the size prefixes.
+def read_offsets(file, path):
+    offsets = array("Q")
+    if os.path.exists(index_path(path)):
+        with open(index_path(path), "rb") as index:
+            data = index.read()
+        offsets.frombytes(data[:len(data) - len(data) % OFFSET.size])
+        if sys.byteorder != "little":
+            offsets.byteswap()
+    size = file.seek(0, os.SEEK_END)
+    while offsets and offsets[-1] >= size:
+        offsets.pop()
+    position = offsets.pop() if offsets else HEADER.size
+    while True:
+        file.seek(position)
+        prefix = file.read(SIZE.size)
+        if len(prefix) < SIZE.size:
+            break
+        end = position + SIZE.size + SIZE.unpack(prefix)[0]
+        # A game still being written, or cut off by a crash
+        if end > size:
+            break
+        offsets.append(position)
+        position = end
+    return offsets, position
+
+class GameRecordWriter:
+    # Appends to path, creating it if needed. A game left half written by a crash is dropped.
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a+b")
+        if self.file.seek(0, os.SEEK_END) == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION))
+            offsets, self.end = [], HEADER.size
+        else:
+            check_header(self.file, path)
+            offsets, self.end = read_offsets(self.file, path)
+            self.file.truncate(self.end)
+        self.count = len(offsets)
+        # Rewrite the index if it was missing or out of step with the games
+        indexed = os.path.getsize(index_path(path)) if os.path.exists(index_path(path)) else -1
+        self.index = open(index_path(path), "ab" if indexed == OFFSET.size * self.count else "wb")
+        if indexed != OFFSET.size * self.count:
+            self.index.write(b"".join(OFFSET.pack(offset) for offset in offsets))
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        self.index.close()
+
+    # The game goes after the buffered ones, flush() makes them visible to readers
+    def write(self, record):
+        data = record.encode()
+        self.file.write(SIZE.pack(len(data)) + data)
+        self.index.write(OFFSET.pack(self.end))
+        self.end += SIZE.size + len(data)
+        self.count += 1
+
+    # Games before the index, so a reader never finds an offset past the end of the games
+    def flush(self):
+        self.file.flush()
+        self.index.flush()
+
+class GameRecordReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        check_header(self.file, path)
+        self.offsets = None # Loaded on the first access by index
+
+    def close(self):
+        self.file.close()
+
+    # Streams the games in order without the index. Games appended while iterating are included.
+    def __iter__(self):
+        position = HEADER.size
+        while True:
+            self.file.seek(position)
+            prefix = self.file.read(SIZE.size)
+            if len(prefix) < SIZE.size:
+                return
+            size = SIZE.unpack(prefix)[0]
+            data = self.file.read(size)
+            if len(data) < size:
+                return
+            position += SIZE.size + size
+            yield GameRecord.decode(data)
+
+    # Number of complete games when the index was loaded
+    def __len__(self):
+        return len(self.get_offsets())
+
+    def __getitem__(self, index):
+        offsets = self.get_offsets()
+        if index < 0:
+            index += len(offsets)
+        if not 0 <= index < len(offsets):
+            raise IndexError(f"Game {index} is not in {self.path}")
+        self.file.seek(offsets[index])
+        size = SIZE.unpack(self.file.read(SIZE.size))[0]
+        return GameRecord.decode(self.file.read(size))
+
+    def get_offsets(self):
+        if self.offsets == None:
+            self.offsets, _ = read_offsets(self.file, self.path)
+        return self.offsets
+
+    # Yields (game index, ply, state) for every position of every game, starting from start
+    def positions(self, engine=ARRAY_ENGINE, start=0):
+        games = iter(self) if start == 0 else (self[index] for index in range(start, len(self)))
+        for index, record in enumerate(games, start):
+            for ply, state in enumerate(record.positions(engine)):
+                yield index, ply, state
+
+# Streams the games of a record file
+def read_records(path):
+    reader = GameRecordReader(path)
+    try:
+        yield from reader
+    finally:
+        reader.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a game record file, or print one of its games")
+    parser.add_argument("path")
+    parser.add_argument("--game", type=int, default=None, help="print this game, counting from 0")
+    args = parser.parse_args()
+
+    if args.game != None:
+        reader = GameRecordReader(args.path)
+        try:
+            print(reader[args.game].to_dict())
+        finally:
+            reader.close()
+    else:
+        games = plies = 0
+        results = {name: 0 for name in RESULT_NAMES.values()}
+        for record in read_records(args.path):
+            games += 1
+            plies += len(record.moves)
+            results[RESULT_NAMES[record.result]] += 1
+        size = os.path.getsize(args.path)
+        print(f"{games} games, {plies} positions, {size} bytes ({size / max(games, 1):.1f} per game)")
+        print(", ".join(f"{count} {name}" for name, count in results.items()))
@@ -0,0 +1,249 @@
+"""
+  server.py
+  Headless asyncio game server: every TCP connection owns a Connect4Game, AI moves are searched by a shared process pool
+
+  Protocol: one JSON object per line each way. Columns are 1-7, every reply has "ok" and, on success, the game state.
+    {"cmd": "new", "ai_color": "yellow" | "red" | null}    start a game, the AI moves at once if it plays yellow
+    {"cmd": "move", "column": 4}                          play a move, the AI replies in the same response if it is its turn
+    {"cmd": "ai", "time_limit": 0.2}                      have the AI play the side to move
+    {"cmd": "state"}
+    {"cmd": "stats"}                                      server throughput and AI move latency percentiles
+  "move", "ai" and "new" accept "time_limit", the AI's budget in seconds for that request, queueing included. It must be
+  a positive number and is checked before the client's move is played.
+  When the server is too busy for the AI to reply to "new" or "move", the game is kept as it is and the response has
+  "ai_error" instead of "ai_column". Send "ai" to ask for the reply again.
+
+  python server.py --port 4444 --time-limit 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from ai.agent import Agent
+from ai.state import state_from_moves
+from game import Connect4Game
+from utils import AI_MODE, PLAYER_MODE, BITBOARD_ENGINE, YELLOW_NUM, RED_NUM
+
+COLORS = {"yellow": YELLOW_NUM, "red": RED_NUM}
+COLOR_NAMES = {YELLOW_NUM: "yellow", RED_NUM: "red", None: None}
+
+# AI move latencies kept for the percentiles
+LATENCY_SAMPLES = 10000
+
+# A search is always given at least this long, even when its budget was used up waiting in the queue
+MIN_SEARCH_TIME = 0.01
+
+class RequestError(Exception):
+    pass
+
+# Agent of the current worker process, created once by _init_worker so its tables stay warm between requests
+_worker_agent = None
+
+def _init_worker(algorithm, depth):
+    global _worker_agent
+    _worker_agent = Agent(algorithm=algorithm, depth=depth, engine=BITBOARD_ENGINE)
+
+# Runs in a worker. deadline is a time.time() value, wall clock time being the one shared between processes.
+def _search(moves, deadline):
+    _worker_agent.time_limit = max(deadline - time.time(), MIN_SEARCH_TIME)
+    return _worker_agent.get_move(state_from_moves(moves, BITBOARD_ENGINE))
+
+# Nearest-rank percentiles of samples, e.g. percentiles(latencies, (50, 90, 99))
+def percentiles(samples, points):
+    ordered = sorted(samples)
+    if not ordered:
+        return {point: None for point in points}
+    return {point: ordered[min(len(ordered) - 1, max(0, -(-point * len(ordered) // 100) - 1))] for point in points}
+
+def game_state(game):
+    return {
+        "moves": "".join(str(action + 1) for action in game.state.moves),
+        "turn": COLOR_NAMES[game.state.turn],
+        "ai_color": COLOR_NAMES[game.ai_color],
+        "game_over": game.game_over,
+        "winner": COLOR_NAMES[game.winner],
+    }
+
+class GameServer:
+    def __init__(self, algorithm="pvs", depth=None, time_limit=0.1, max_time_limit=1.0, workers=None, max_pending=None):
+        self.time_limit = time_limit
+        self.max_time_limit = max_time_limit
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(algorithm, depth))
+        # Searches allowed in the pool or queued for it at once, requests past that wait and are refused when their budget runs out
+        self.max_pending = max_pending or 2 * self.workers
+        self.slots = asyncio.Semaphore(self.max_pending)
+        self.pending = 0
+        self.connections = 0
+        self.games = 0 # Finished games
+        self.moves = 0
+        self.ai_moves = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.started = time.perf_counter()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        game = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise RequestError("Requests must be JSON objects")
+                    game, response = await self.dispatch(game, request)
+                    response["ok"] = True
+                except (RequestError, ValueError, TypeError) as error:
+                    response = {"ok": False, "error": str(error)}
+                writer.write((json.dumps(response) + "\n").encode())
+                # Stop reading from a client that is not reading its replies
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def dispatch(self, game, request):
+        command = request.get("cmd")
+        # Checked before anything is played, so a bad budget never leaves a move without its reply
+        if command in ("new", "move", "ai"):
+            time_limit = self.get_time_limit(request)
+        if command == "stats":
+            return game, self.get_stats()
+        if command == "new":
+            ai_color = request.get("ai_color")
+            if ai_color not in COLORS and ai_color != None:
+                raise RequestError(f"Unknown color {ai_color}")
+            game = Connect4Game(game_mode=AI_MODE if ai_color != None else PLAYER_MODE, engine=BITBOARD_ENGINE)
+            game.ai_color = COLORS.get(ai_color)
+            return game, await self.reply(game, time_limit)
+
+        if game == None:
+            raise RequestError("No game, send new first")
+        if command == "state":
+            return game, game_state(game)
+        if command == "move":
+            column = request.get("column")
+            if game.game_over:
+                raise RequestError("The game is over")
+            if game.ai_color == game.state.turn:
+                raise RequestError("It is the AI's turn")
+            if not isinstance(column, int) or not 1 <= column <= 7 or not game.state.is_legal_action(column - 1):
+                raise RequestError(f"Illegal column {column}")
+            self.play(game, column - 1)
+            return game, await self.reply(game, time_limit)
+        if command == "ai":
+            if game.game_over:
+                raise RequestError("The game is over")
+            column = await self.ai_move(game, time_limit)
+            return game, dict(game_state(game), ai_column=column)
+        raise RequestError(f"Unknown command {command}")
+
+    # The AI's budget for a request in seconds, capped by max_time_limit
+    def get_time_limit(self, request):
+        time_limit = request.get("time_limit")
+        if time_limit == None:
+            time_limit = self.time_limit
+        if isinstance(time_limit, bool) or not isinstance(time_limit, (int, float)) or not math.isfinite(time_limit) or time_limit <= 0:
+            raise RequestError(f"time_limit must be a positive number of seconds, not {time_limit!r}")
+        return min(time_limit, self.max_time_limit)
+
+    def play(self, game, action):
+        game.make_move(action)
+        self.moves += 1
+        if game.game_over:
+            self.games += 1
+
+    # Game state after the AI's reply, if it is the AI's turn. The game is left as it is when the server is too busy,
+    # with the reason in ai_error, so a move the client made is never lost.
+    async def reply(self, game, time_limit):
+        response = {}
+        if game.ai_color == game.state.turn and not game.game_over:
+            try:
+                response["ai_column"] = await self.ai_move(game, time_limit)
+            except RequestError as error:
+                response["ai_error"] = str(error)
+        return dict(game_state(game), **response)
+
+    # Search the side to move in the pool within budget seconds and play the move, returns its column (1-7)
+    async def ai_move(self, game, budget):
+        received = time.perf_counter()
+        deadline = time.time() + budget
+        try:
+            await asyncio.wait_for(self.slots.acquire(), budget)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise RequestError("Server busy, try again")
+        self.pending += 1
+        try:
+            moves = "".join(str(action + 1) for action in game.state.moves)
+            action = await asyncio.get_running_loop().run_in_executor(self.pool, _search, moves, deadline)
+        finally:
+            self.pending -= 1
+            self.slots.release()
+        self.latencies.append(time.perf_counter() - received)
+        self.ai_moves += 1
+        self.play(game, action)
+        return action + 1
+
+    def get_stats(self):
+        elapsed = time.perf_counter() - self.started
+        latency = percentiles(self.latencies, (50, 90, 99, 100))
+        return {
+            "uptime": elapsed,
+            "connections": self.connections,
+            "pending": self.pending,
+            "games": self.games,
+            "moves": self.moves,
+            "ai_moves": self.ai_moves,
+            "rejected": self.rejected,
+            "games_per_second": self.games / elapsed,
+            "moves_per_second": self.moves / elapsed,
+            "latency_ms": {f"p{point}": None if value == None else value * 1000 for point, value in latency.items()},
+        }
+
+async def serve(host, port, server):
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving on {host}:{port} with {server.workers} workers")
+    async with listener:
+        await listener.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Connect 4 games over TCP, one JSON object per line")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4444)
+    parser.add_argument("--algorithm", default="pvs")
+    parser.add_argument("--depth", type=int, default=None, help="cap on the search depth")
+    parser.add_argument("--time-limit", type=float, default=0.1, help="default AI budget per move in seconds")
+    parser.add_argument("--max-time-limit", type=float, default=1.0, help="largest budget a request can ask for")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-pending", type=int, default=None, help="searches running or queued at once, default twice the workers")
+    args = parser.parse_args()
+
+    async def main():
+        server = GameServer(args.algorithm, args.depth, args.time_limit, args.max_time_limit, args.workers, args.max_pending)
+        # Shut down the same way on SIGTERM as on Ctrl+C, printing the final stats
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        try:
+            await serve(args.host, args.port, server)
+        finally:
+            print(json.dumps(server.get_stats()))
+            server.close()
+
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
@@ -0,0 +1,61 @@
+"""
+  test_bitboard.py
+  BitboardState (ai/bitboard.py) and its IncrementalEvaluator (ai/incremental.py) against the array GameState
+"""
+
+import random
+import numpy as np
+from ai.bitboard import BitboardState
+from ai.state import GameState, new_state, convert_state
+from ai.transposition import compute_hash
+from utils import ARRAY_ENGINE, BITBOARD_ENGINE
+
+def check_same(bitboard, array):
+    assert bitboard.turn == array.turn
+    assert bitboard.heights == array.heights
+    assert bitboard.get_legal_actions() == array.get_legal_actions()
+    assert bitboard.get_winner() == array.get_winner()
+    assert bitboard.is_tie() == array.is_tie()
+
+    assert bitboard.hash == bitboard.compute_hash() == array.hash == compute_hash(array.board, array.turn)
+    assert np.array_equal(bitboard.board, array.board)
+    converted = BitboardState.from_board(array.board, array.turn)
+    assert (converted.current, converted.mask) == (bitboard.current, bitboard.mask)
+    assert np.array_equal(convert_state(bitboard, ARRAY_ENGINE).board, array.board)
+
+    # Running scores against scores counted from scratch
+    scratch = BitboardState(bitboard.current, bitboard.mask, bitboard.turn).evaluate()
+    assert bitboard.evaluate() == array.evaluate() == scratch == GameState(array.board.copy(), array.turn).evaluate()
+
+def test_random_games():
+    rng = random.Random(0)
+    for _ in range(50):
+        bitboard = new_state(BITBOARD_ENGINE)
+        array = new_state(ARRAY_ENGINE)
+        bitboard.attach_evaluator()
+        array.attach_evaluator()
+        check_same(bitboard, array)
+        while bitboard.get_winner() == None and not bitboard.is_tie():
+            action = rng.choice(bitboard.get_legal_actions())
+            bitboard.play(action)
+            array.play(action)
+            check_same(bitboard, array)
+
+        # Take every move back and check the positions on the way
+        for action in reversed(list(bitboard.moves)):
+            bitboard.undo(action)
+            array.undo(action)
+            check_same(bitboard, array)
+        assert (bitboard.current, bitboard.mask, bitboard.hash) == (0, 0, 0)
+        assert bitboard.evaluate() == 0
+
+def test_new_states():
+    rng = random.Random(1)
+    for _ in range(50):
+        bitboard = new_state(BITBOARD_ENGINE)
+        array = new_state(ARRAY_ENGINE)
+        while bitboard.get_winner() == None and not bitboard.is_tie():
+            action = rng.choice(bitboard.get_legal_actions())
+            bitboard = bitboard.get_new_state(action)
+            array = array.get_new_state(action)
+            check_same(bitboard, array)
@@ -0,0 +1,50 @@
+"""
+  test_evaluation.py
+  Parity of the vectorized evaluation (ai/evaluation.py) with the scalar GameState counters
+"""
+
+import random
+import numpy as np
+from ai.evaluation import count_windows, evaluate_boards
+from ai.state import new_state
+from utils import ARRAY_ENGINE, THREE_IN_ROW_MULT, TWO_IN_ROW_MULT, CENTER_MULT
+
+# Positions reached by random legal moves, stopping before the game ends, from empty to nearly full boards
+def random_states(count, seed=0):
+    rng = random.Random(seed)
+    states = []
+    for _ in range(count):
+        state = new_state(ARRAY_ENGINE)
+        for _ in range(rng.randrange(42)):
+            child = state.get_new_state(rng.choice(state.get_legal_actions()))
+            if child.get_winner() != None or child.is_tie():
+                break
+            state = child
+        states.append(state)
+    return states
+
+def scalar_counts(state):
+    return state.count_three_in_row(), state.count_two_in_row(), state.count_center()
+
+def scalar_evaluation(state):
+    three, two, center = scalar_counts(state)
+    return THREE_IN_ROW_MULT * three + TWO_IN_ROW_MULT * two + CENTER_MULT * center
+
+def test_single_boards():
+    for state in random_states(200):
+        assert count_windows(state.board) == scalar_counts(state)
+        assert evaluate_boards(state.board) == scalar_evaluation(state)
+        assert state.evaluate() == scalar_evaluation(state)
+
+def test_stacks():
+    states = random_states(200, seed=1)
+    boards = np.array([state.board for state in states])
+    three, two, center = count_windows(boards)
+    assert len(three) == len(states)
+    assert [tuple(counts) for counts in zip(three.tolist(), two.tolist(), center.tolist())] == [scalar_counts(state) for state in states]
+    assert evaluate_boards(boards).tolist() == [scalar_evaluation(state) for state in states]
+
+def test_empty_board():
+    state = new_state(ARRAY_ENGINE)
+    assert count_windows(state.board) == (0, 0, 0)
+    assert evaluate_boards(np.zeros((0, 6, 7))).shape == (0,)
@@ -0,0 +1,49 @@
+"""
+  test_game.py
+  Connect4Game results on both engines, including the state left behind once the game is over
+"""
+
+import pytest
+from game import Connect4Game
+from utils import ARRAY_ENGINE, BITBOARD_ENGINE, YELLOW_NUM, RED_NUM
+
+ENGINES = [ARRAY_ENGINE, BITBOARD_ENGINE]
+
+def play(moves, engine):
+    game = Connect4Game(engine=engine)
+    for move in moves:
+        assert not game.game_over
+        game.make_move(int(move) - 1)
+    return game
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("moves, winner", [
+    ("1212121", YELLOW_NUM), # Vertical
+    ("1122334", YELLOW_NUM), # Horizontal
+    ("71212121", RED_NUM),
+    ("12235334444", YELLOW_NUM), # Diagonal
+])
+def test_finished_game_winner(moves, winner, engine):
+    game = play(moves, engine)
+    assert game.game_over
+    assert game.winner == winner
+    assert game.state.get_winner() == winner
+    # The turn is left on the player who made the final move
+    assert game.state.turn == winner
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_unfinished_game(engine):
+    game = play("121212", engine)
+    assert not game.game_over
+    assert game.winner == None
+    assert game.state.get_winner() == None
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_tie(engine):
+    # Columns filled in pairs so nobody ever has four in a row
+    moves = "121212" + "212121" + "343434" + "434343" + "565656" + "656565" + "777777"
+    game = play(moves, engine)
+    assert game.game_over
+    assert game.winner == None
+    assert game.state.get_winner() == None
+    assert game.state.is_tie()
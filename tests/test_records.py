@@ -0,0 +1,148 @@
+"""
+  test_records.py
+  The binary game record format (records.py): encoding, the .idx sidecar and recovery from crashes
+"""
+
+import os
+import pytest
+from records import GameRecord, GameRecordReader, GameRecordWriter, HEADER, SIZE, FIXED, index_path, read_records
+from utils import YELLOW_NUM, RED_NUM
+
+DRAWN_GAME = "547125662261271266215743771576315353334444"
+
+def moves(text):
+    return [int(move) - 1 for move in text]
+
+def fields(record):
+    return record.moves, record.winner, record.finished, record.yellow, record.red, record.opening
+
+RECORDS = [
+    GameRecord([], finished=False),
+    GameRecord(moves("1212121"), YELLOW_NUM, yellow="pvs:depth=4", red="random"),
+    GameRecord(moves("71212121"), RED_NUM, yellow="random", red="mcts:playouts=100", times=[0.5, 0.25, 0.125, 1.0, 2.0, 0.0], opening=2),
+    GameRecord(moves(DRAWN_GAME), None, times=[0.001 * i for i in range(42)]),
+]
+
+# Half floats keep about three significant digits
+def same_record(a, b):
+    assert fields(a) == fields(b)
+    if a.times == None:
+        assert b.times == None
+    else:
+        assert b.times == pytest.approx(a.times, rel=1e-3, abs=1e-6)
+
+def write(path, records):
+    writer = GameRecordWriter(path)
+    for record in records:
+        writer.write(record)
+    writer.close()
+
+@pytest.mark.parametrize("record", RECORDS)
+def test_round_trip(record):
+    same_record(record, GameRecord.decode(record.encode()))
+
+def test_full_game():
+    record = GameRecord.decode(RECORDS[-1].encode())
+    assert len(record.moves) == 42
+    assert record.finished and record.winner == None
+    game = record.to_game()
+    assert game.game_over and game.winner == None
+
+def test_read_back(tmp_path):
+    path = str(tmp_path / "games.c4r")
+    write(path, RECORDS[:2])
+    write(path, RECORDS[2:])
+    for record, read in zip(RECORDS, read_records(path)):
+        same_record(record, read)
+    reader = GameRecordReader(path)
+    assert len(reader) == len(RECORDS)
+    same_record(RECORDS[-1], reader[-1])
+    same_record(RECORDS[1], reader[1])
+    with pytest.raises(IndexError):
+        reader[len(RECORDS)]
+    reader.close()
+
+def test_torn_record_dropped(tmp_path):
+    path = str(tmp_path / "games.c4r")
+    write(path, RECORDS[:3])
+    # A crash part way through writing the last game
+    data = RECORDS[3].encode()
+    with open(path, "ab") as file:
+        file.write(SIZE.pack(len(data)) + data[:len(data) // 2])
+    assert len(list(read_records(path))) == 3
+    reader = GameRecordReader(path)
+    assert len(reader) == 3
+    reader.close()
+
+    # The next writer cuts the torn game off before appending
+    write(path, RECORDS[3:])
+    read = list(read_records(path))
+    assert len(read) == 4
+    same_record(RECORDS[3], read[3])
+
+def test_truncated_index_rebuilt(tmp_path):
+    path = str(tmp_path / "games.c4r")
+    write(path, RECORDS)
+    with open(index_path(path), "r+b") as index:
+        index.truncate(12)
+    write(path, RECORDS[:1])
+    assert os.path.getsize(index_path(path)) == 8 * 5
+    reader = GameRecordReader(path)
+    for i, record in enumerate(RECORDS + RECORDS[:1]):
+        same_record(record, reader[i])
+    reader.close()
+
+def test_missing_index_rebuilt(tmp_path):
+    path = str(tmp_path / "games.c4r")
+    write(path, RECORDS)
+    os.remove(index_path(path))
+    reader = GameRecordReader(path)
+    same_record(RECORDS[2], reader[2])
+    reader.close()
+    write(path, [])
+    assert os.path.getsize(index_path(path)) == 8 * len(RECORDS)
+
+def test_stale_index_rebuilt(tmp_path):
+    path = str(tmp_path / "games.c4r")
+    write(path, RECORDS)
+    # The games file lost its last game but the index still lists it
+    reader = GameRecordReader(path)
+    last = reader.get_offsets()[-1]
+    reader.close()
+    with open(path, "r+b") as file:
+        file.truncate(last)
+    write(path, RECORDS[1:2])
+    assert os.path.getsize(index_path(path)) == 8 * len(RECORDS)
+    reader = GameRecordReader(path)
+    for i, record in enumerate(RECORDS[:3] + RECORDS[1:2]):
+        same_record(record, reader[i])
+    reader.close()
+
+def test_corrupt_record():
+    data = RECORDS[1].encode()
+    with pytest.raises(ValueError):
+        GameRecord.decode(data[:-1])
+    with pytest.raises(ValueError):
+        GameRecord.decode(data + b"\0")
+    # Unknown result
+    with pytest.raises(ValueError):
+        GameRecord.decode(bytes([9]) + data[1:])
+    # Cut off in the middle of the fixed fields, and of the times
+    with pytest.raises(ValueError):
+        GameRecord.decode(data[:3])
+    with pytest.raises(ValueError):
+        GameRecord.decode(RECORDS[2].encode()[:FIXED.size + 24])
+    # A move of 7, past the last column
+    with pytest.raises(ValueError):
+        GameRecord.decode(FIXED.pack(0, 0, 1, 0, 0, 0) + b"\x07")
+
+@pytest.mark.parametrize("header", [b"", b"C4G", b"XXXX\x01\x00", HEADER.pack(b"C4GR", 99)])
+def test_bad_header(tmp_path, header):
+    path = str(tmp_path / "games.c4r")
+    with open(path, "wb") as file:
+        file.write(header)
+    with pytest.raises(ValueError):
+        GameRecordReader(path)
+    if header:
+        with pytest.raises(ValueError):
+            GameRecordWriter(path)
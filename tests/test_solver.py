@@ -0,0 +1,95 @@
+"""
+  test_solver.py
+  The exact solver (ai/solver.py) against a plain negamax over every continuation, and its scores on known positions
+"""
+
+import random
+import time
+import pytest
+from ai.agent import Agent
+from ai.minimax import SearchContext, SearchTimeout, TIME_CHECK_INTERVAL
+from ai.solver import Solver, CELLS, distance_to_end
+from ai.state import new_state, state_from_moves
+from utils import BITBOARD_ENGINE
+
+# Score of a position with the same convention as the solver, found by trying every move.
+# Positions are remembered so late positions are solved in well under a second.
+def brute_force(state, memo):
+    key = (state.current, state.mask)
+    if key not in memo:
+        moves = len(state.moves)
+        best = 0 if state.is_tie() else None
+        for action in state.get_legal_actions():
+            state.play(action)
+            score = (CELLS + 1 - moves) // 2 if state.is_winning_move() else -brute_force(state, memo)
+            state.undo(action)
+            if best == None or score > best:
+                best = score
+        memo[key] = best
+    return memo[key]
+
+# Unfinished positions with 28 to 35 moves played
+def random_states(count, seed=0):
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        state = new_state(BITBOARD_ENGINE)
+        for _ in range(rng.randrange(28, 36)):
+            state.play(rng.choice(state.get_legal_actions()))
+            if state.get_winner() != None or state.is_tie():
+                break
+        else:
+            states.append(state)
+    return states
+
+def sign(score):
+    return (score > 0) - (score < 0)
+
+def test_matches_brute_force():
+    solver = Solver()
+    for state in random_states(30):
+        memo = {}
+        score = brute_force(state, memo)
+        assert solver.solve(state) == score
+        assert sign(solver.solve(state, weak=True)) == sign(score)
+
+        action, action_score = solver.best_action(state)
+        assert action_score == score
+        state.play(action)
+        if state.is_winning_move():
+            assert score == (CELLS + 1 - (len(state.moves) - 1)) // 2
+        else:
+            assert -brute_force(state, memo) == score
+        state.undo(action)
+
+@pytest.mark.parametrize("moves, score, distance", [
+    ("121212", 18, 1), # Yellow wins with its next piece
+    ("37475", -18, 2), # Yellow threatens both ends of its three, red can only block one
+    ("5471256622612712662157437715763153", 0, 8), # Draw
+])
+def test_known_positions(moves, score, distance):
+    state = state_from_moves(moves, BITBOARD_ENGINE)
+    solver = Solver()
+    assert solver.solve(state) == score
+    assert sign(solver.solve(state, weak=True)) == sign(score)
+    assert distance_to_end(score, len(moves)) == distance
+
+def test_best_action_of_a_lost_position():
+    state = state_from_moves("37475", BITBOARD_ENGINE)
+    action, score = Solver().best_action(state)
+    assert score == -18
+    assert state.is_legal_action(action)
+
+def test_stops_at_the_deadline():
+    solver = Solver()
+    solver.context = SearchContext(deadline=time.perf_counter())
+    with pytest.raises(SearchTimeout):
+        solver.solve(new_state(BITBOARD_ENGINE))
+
+def test_agent_node_limit():
+    agent = Agent(algorithm="pvs", depth=4, engine=BITBOARD_ENGINE)
+    with pytest.raises(SearchTimeout):
+        agent.solve(new_state(BITBOARD_ENGINE), max_nodes=TIME_CHECK_INTERVAL)
+    assert agent.context.max_nodes == None
+    state = state_from_moves("5471256622612712662157437715763153", BITBOARD_ENGINE)
+    assert agent.solve(state, max_nodes=TIME_CHECK_INTERVAL).solved_score == 0
@@ -5,6 +5,11 @@
 
 BOT_DEPTH = 4
 
+# State representations ("engines") the game and the bot can run on
+ARRAY_ENGINE = "array"
+BITBOARD_ENGINE = "bitboard"
+BOT_ENGINE = BITBOARD_ENGINE
+
 # Internal player representations
 YELLOW_NUM = 1
 RED_NUM = 2
@@ -18,6 +23,24 @@ WIN_SCORE = 1000000000000
 THREE_IN_ROW_MULT = 100
 TWO_IN_ROW_MULT = 10
 CENTER_MULT = 1
+TT_SIZE_MB = 64 # Memory cap for the transposition table
+SOLVER_EMPTY_CELLS = 20 # Positions with this many empty cells or fewer are solved exactly
+SOLVER_NODE_LIMIT = 30_000 # Fixed depth searches give up on solving after this many nodes and search instead
+BOOK_PATH = "opening_book.bin" # Built with python -m ai.book
+BOT_PONDER = True # Search on the player's time in Player vs. AI games
+CACHE_PATH = "position_cache.sqlite" # Persistent position cache, see ai/cache.py
+BOT_CACHE = False # Keep the bot's search results in CACHE_PATH between games
+CACHE_MAX_ENTRIES = 1_000_000
+CACHE_MIN_DEPTH = BOT_DEPTH # Shallower results are not worth keeping, nor used by time limited searches
+
+# Monte Carlo tree search parameters
+MCTS_EXPLORATION = 1.41 # UCT exploration constant, sqrt(2) in theory
+MCTS_BATCH_SIZE = 32 # Random playouts run together from each new leaf
+
+# Frame pacing
+FPS = 60 # Cap on frames per second
+THINKING_FPS = 30 # ... while the AI is thinking, leaving the rest of the time to the search
+IDLE_TIMEOUT = 500 # Milliseconds to wait for an event before drawing again when nothing is moving
 
 # Dimesnions
 SCREEN_WIDTH = 800